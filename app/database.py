@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -6,17 +7,116 @@ import os
 # Путь к базе данных
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./shoe_store.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
-    echo=False
-)
+# Пул подключений к PostgreSQL (на каждый процесс приложения)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # с ожидания свободного подключения
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # с жизни подключения
+
+# Запрос готовится на сервере (PREPARE) после стольких выполнений в подключении;
+# пустое значение отключает подготовку (нужно для PgBouncer в режиме transaction)
+DB_PREPARE_THRESHOLD = os.getenv("DB_PREPARE_THRESHOLD", "5")
+
+# Профили настроек SQLite (PRAGMA при каждом подключении)
+SQLITE_PROFILES = {
+    # Веб-приложение и десктоп-клиент работают с одним файлом базы:
+    # WAL — чтение не блокируется записью, NORMAL — fsync только при checkpoint
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,  # мс ожидания блокировки вместо "database is locked"
+        "foreign_keys": "ON",
+        "cache_size": -65536,  # КиБ (64 МБ) на подключение
+        "mmap_size": 268435456,  # 256 МБ
+        "temp_store": "MEMORY",
+    },
+    # Настройки SQLite по умолчанию (журнал отката, synchronous=FULL)
+    "default": {
+        "busy_timeout": 5000,
+    },
+}
+
+# Профиль выбирается SQLITE_PROFILE, отдельные PRAGMA переопределяются SQLITE_<ИМЯ>,
+# например SQLITE_SYNCHRONOUS=FULL
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production")
+
+
+def get_sqlite_pragmas(profile: str = SQLITE_PROFILE) -> dict:
+    """PRAGMA профиля SQLite с учётом переопределений из окружения"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Неизвестный профиль SQLite: {profile}")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for name in set(pragmas) | set(SQLITE_PROFILES["production"]):
+        value = os.getenv(f"SQLITE_{name.upper()}")
+        if value:
+            pragmas[name] = value
+    return pragmas
+
+
+def get_engine_options(url) -> dict:
+    """Параметры create_engine для СУБД из URL"""
+    if url.get_backend_name() == "sqlite":
+        return {"connect_args": {"check_same_thread": False}}
+    if url.get_backend_name() == "postgresql":
+        connect_args = {}
+        if url.get_driver_name() == "psycopg":
+            connect_args["prepare_threshold"] = int(DB_PREPARE_THRESHOLD) if DB_PREPARE_THRESHOLD else None
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            # Проверка подключения перед выдачей из пула (рестарт сервера, обрыв сети)
+            "pool_pre_ping": True,
+            "connect_args": connect_args,
+        }
+    return {}
+
+
+def get_database_url(database_url: str = DATABASE_URL):
+    """URL базы данных; postgresql:// и postgres:// подключаются драйвером psycopg 3"""
+    url = make_url(database_url.replace("postgres://", "postgresql://", 1))
+    if url.drivername == "postgresql":
+        url = url.set(drivername="postgresql+psycopg")
+    return url
+
+
+database_url = get_database_url()
+engine = create_engine(database_url, echo=False, **get_engine_options(database_url))
+
+if engine.dialect.name == "sqlite":
+    sqlite_pragmas = get_sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Применение PRAGMA профиля к новому подключению SQLite"""
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in sqlite_pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 
+def init_db(bind=None):
+    """Создание недостающих таблиц и индексов (bind — движок, по умолчанию engine)
+
+    В PostgreSQL схема создаётся под advisory-блокировкой: несколько
+    процессов приложения при запуске не создают её одновременно.
+    """
+    # Модели регистрируют таблицы в Base.metadata при импорте
+    import app.models  # noqa: F401
+
+    with (bind or engine).begin() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.exec_driver_sql("SELECT pg_advisory_xact_lock(hashtext('shoe_store_schema'))")
+        Base.metadata.create_all(bind=connection)
+
+
 def get_db():
     """Получение сессии базы данных"""
     db = SessionLocal()
@@ -24,4 +124,3 @@ def get_db():
         yield db
     finally:
         db.close()
-
@@ -0,0 +1,12 @@
+"""
+Импорт данных из Excel и CSV файлов
+
+Общий конвейер для скриптов migrations/ и экрана импорта десктопного
+приложения: чтение файла пачками → нормализация → дедупликация →
+пакетная запись, с замером времени каждого этапа.
+"""
+from app.importer.pipeline import ImportCancelled, ImportProgress, ImportResult, Importer
+from app.importer.sources import read_source
+from app.importer.users import UsersImporter, import_users
+from app.importer.products import ProductsImporter, import_products
+from app.importer.orders import OrdersImporter, import_orders
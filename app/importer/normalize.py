@@ -0,0 +1,122 @@
+"""
+Нормализация колонок импорта
+
+Функции работают с колонками DataFrame целиком. Колонка ищется по
+нескольким именам: заголовки Excel файлов из pril/ и CSV файлов различаются.
+"""
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Форматы дат в файлах импорта
+DATE_FORMATS = ['%d.%m.%Y', '%Y-%m-%d', '%d.%m.%Y %H:%M:%S', '%Y-%m-%d %H:%M:%S', '%d.%m.%Y %H:%M']
+
+
+def find_column(df: pd.DataFrame, *names: str):
+    """Первая найденная в DataFrame колонка из списка имён"""
+    for name in names:
+        if name in df.columns:
+            return df[name]
+    return None
+
+
+def text_column(df: pd.DataFrame, *names: str, default: str = '') -> pd.Series:
+    """Текстовая колонка с обрезкой пробелов; пропуски — default"""
+    column = find_column(df, *names)
+    if column is None:
+        return pd.Series(default, index=df.index, dtype=object)
+    return column.fillna(default).astype(str).str.strip()
+
+
+def number_column(df: pd.DataFrame, *names: str) -> pd.Series:
+    """Числовая колонка; ошибки разбора и пропуски — 0"""
+    column = find_column(df, *names)
+    if column is None:
+        return pd.Series(0, index=df.index, dtype=float)
+    return pd.to_numeric(column, errors='coerce').fillna(0)
+
+
+def parse_date(value):
+    """Разбор даты из ячейки: datetime, строка в одном из DATE_FORMATS или пусто"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, datetime):
+        return value.to_pydatetime() if isinstance(value, pd.Timestamp) else value
+    if isinstance(value, str):
+        value = value.strip()
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+    return None
+
+
+class DateParser:
+    """Разбор колонки дат целиком с запоминанием формата файла
+
+    Строки разбираются pd.to_datetime сразу по всей колонке, начиная с
+    формата, подошедшего в прошлой пачке; остальные форматы пробуются только
+    для строк, которые не разобрались. Значения других типов — построчно.
+    """
+
+    def __init__(self, formats: list = DATE_FORMATS):
+        self.formats = list(formats)
+
+    def parse(self, column: pd.Series) -> pd.Series:
+        values = column.to_numpy(dtype=object)
+        result = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+        types = column.map(type).to_numpy()
+        is_str = types == str
+        is_datetime = (types == datetime) | (types == pd.Timestamp)
+
+        if is_datetime.any():
+            result[is_datetime] = pd.to_datetime(values[is_datetime]).to_numpy()
+
+        pending = np.flatnonzero(is_str)
+        strings = pd.Series(values[pending]).str.strip().to_numpy(dtype=object)
+        for i, fmt in enumerate(self.formats):
+            if not len(pending):
+                break
+            parsed = pd.to_datetime(strings, format=fmt, errors='coerce').to_numpy()
+            matched = ~np.isnat(parsed)
+            if matched.any():
+                result[pending[matched]] = parsed[matched]
+                pending, strings = pending[~matched], strings[~matched]
+                # Подошедший формат проверяется первым в следующих пачках
+                if i:
+                    self.formats.insert(0, self.formats.pop(i))
+
+        # Значения других типов (например, date) — построчно
+        others = np.flatnonzero(~is_str & ~is_datetime & column.notna().to_numpy())
+        if len(others):
+            result[others] = pd.to_datetime([parse_date(value) for value in values[others]]).to_numpy()
+        return pd.Series(result, index=column.index)
+
+
+def date_column(df: pd.DataFrame, *names: str, parser: DateParser = None) -> pd.Series:
+    """Колонка дат (datetime64); неразобранные значения — NaT"""
+    column = find_column(df, *names)
+    if column is None:
+        return pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    return (parser or DateParser()).parse(column)
+
+
+def role_column(df: pd.DataFrame, *names: str) -> pd.Series:
+    """Роль пользователя: admin, manager или client"""
+    role_str = text_column(df, *names, default='client').str.lower()
+    role = pd.Series('client', index=df.index, dtype=object)
+    role[role_str.str.contains('менеджер|manager')] = 'manager'
+    role[role_str.str.contains('администратор|admin')] = 'admin'
+    return role
+
+
+def status_column(df: pd.DataFrame, *names: str) -> pd.Series:
+    """Статус заказа: новый, в обработке, выполнен или отменен"""
+    status_str = text_column(df, *names, default='новый').str.lower()
+    status = pd.Series('новый', index=df.index, dtype=object)
+    status[status_str.str.contains('отменен')] = 'отменен'
+    status[status_str.str.contains('обработке')] = 'в обработке'
+    status[status_str.str.contains('новый')] = 'новый'
+    status[status_str.str.contains('завершен|выполнен')] = 'выполнен'
+    return status
@@ -0,0 +1,94 @@
+"""
+Импорт заказов
+
+Номер пункта выдачи заменяется адресом из файла пунктов выдачи,
+заказы вставляются пачками. Позиции заказов (order_items) создаются
+из строки артикулов после вставки всех заказов.
+"""
+from datetime import datetime
+from typing import Optional
+import os
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.importer.normalize import DateParser, date_column, status_column, text_column
+from app.importer.pipeline import ImportResult, Importer, frame_records
+from app.models import Order
+from app.services.change_service import ORDER
+from app.services.order_service import allocate_order_codes, backfill_order_items, is_generated_code
+
+ORDER_COLUMNS = ['article', 'status', 'pickup_address', 'order_date', 'delivery_date', 'code']
+
+
+def load_pickup_points(filepath: Optional[str]) -> list:
+    """Адреса пунктов выдачи: индекс в списке соответствует номеру - 1"""
+    if not filepath or not os.path.exists(filepath):
+        return []
+    # Адреса в первой колонке, индекс соответствует номеру
+    return pd.read_excel(filepath).iloc[:, 0].tolist()
+
+
+class OrdersImporter(Importer):
+    """Импорт заказов из Заказ_import.xlsx или CSV
+
+    У строк заказов нет уникального ключа, поэтому они всегда добавляются:
+    режим upsert на заказы не влияет.
+    """
+    entity = "Заказы"
+    change_entity = ORDER
+
+    def __init__(self, db: Session, pickup_points_file: Optional[str] = None, **kwargs):
+        super().__init__(db, **kwargs)
+        self.pickup_points = load_pickup_points(pickup_points_file)
+        # Формат дат определяется по первой пачке и запоминается на весь файл
+        self.order_dates = DateParser()
+        self.delivery_dates = DateParser()
+        self.seen_codes = set()
+
+    def normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        orders = pd.DataFrame({
+            # Используем поле "Артикул заказа" или "Артикул"
+            'article': text_column(df, 'Артикул заказа', 'Артикул', 'article'),
+            'status': status_column(df, 'Статус заказа', 'Статус', 'status'),
+            'pickup_address': self.pickup_address_column(text_column(df, 'Адрес пункта выдачи', 'pickup_address')),
+            'order_date': date_column(df, 'Дата заказа', 'order_date', parser=self.order_dates),
+            'delivery_date': date_column(df, 'Дата доставки', 'delivery_date', parser=self.delivery_dates),
+            'code': text_column(df, 'Код для получения', 'code'),
+        })
+        # Артикул заказа не уникален - разные заказы могут содержать одинаковые товары
+        orders = orders[orders['article'] != ''].copy()
+        orders['order_date'] = orders['order_date'].fillna(pd.Timestamp(datetime.now()))
+        return orders
+
+    def pickup_address_column(self, raw: pd.Series) -> pd.Series:
+        """Адрес пункта выдачи - может быть номером или полным адресом"""
+        is_number = raw.str.isdigit()
+        numbers = pd.to_numeric(raw.where(is_number), errors='coerce')
+        addresses = numbers.map(
+            lambda number: self.pickup_points[int(number) - 1] if 1 <= number <= len(self.pickup_points) else None
+        )
+        fallback = "Пункт выдачи #" + raw
+        return raw.where(~is_number, addresses.fillna(fallback))
+
+    def write(self, df: pd.DataFrame) -> int:
+        df = df.assign(code=self.assign_codes(df['code']))
+        return self.insert_rows(Order, frame_records(df, ORDER_COLUMNS))
+
+    def assign_codes(self, codes: pd.Series) -> pd.Series:
+        """Коды получения: код из файла сохраняется, если он не повторяется и не совпадает
+        по формату с выдаваемыми кодами; остальным заказам коды выдаются одним блоком"""
+        keep = (codes != '') & ~codes.map(is_generated_code) & ~codes.duplicated() & ~codes.isin(self.seen_codes)
+        keep &= ~codes.isin(self.existing_values(Order.code, codes[keep]))
+        self.seen_codes.update(codes[keep])
+        allocated = pd.Series(allocate_order_codes(self.db, int((~keep).sum())), index=codes.index[~keep], dtype=object)
+        return codes.where(keep, allocated)
+
+    def finish(self) -> int:
+        with self.stage("write"):
+            backfill_order_items(self.db, self.batch_size)
+        return 0
+
+
+def import_orders(db: Session, filepath: str, pickup_points_file: Optional[str] = None, **kwargs) -> ImportResult:
+    """Импорт заказов из файла"""
+    return OrdersImporter(db, pickup_points_file=pickup_points_file, **kwargs).run(filepath)
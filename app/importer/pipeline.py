@@ -0,0 +1,294 @@
+"""
+Конвейер импорта: чтение → нормализация → дедупликация → пакетная запись
+
+Каждый импортёр (пользователи, товары, заказы) реализует этапы для пачки
+строк, а общий цикл читает файл пачками, замеряет время этапов и
+завершает импорт одной транзакцией.
+
+Режимы записи: по умолчанию существующие записи пропускаются, в режиме
+upsert они обновляются (INSERT ... ON CONFLICT DO UPDATE), но только если
+хеш полей строки (import_hash) отличается от сохранённого при прошлом импорте.
+"""
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+import threading
+import time
+import pandas as pd
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.importer.sources import BATCH_SIZE, count_rows, read_source
+from app.services.change_service import RELOAD, log_change
+
+# Названия этапов для отчёта
+STAGE_LABELS = {
+    "parse": "чтение",
+    "normalize": "нормализация",
+    "dedupe": "дедупликация",
+    "hash": "хеширование",
+    "write": "запись",
+}
+
+
+class ImportCancelled(Exception):
+    """Импорт отменён пользователем; изменения откатываются"""
+
+
+@dataclass
+class ImportProgress:
+    """Ход импорта: обработано строк, скорость и оценка оставшегося времени"""
+    entity: str
+    done: int
+    total: Optional[int]
+    elapsed: float
+    finishing: bool = False
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.done / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """Доля выполненного (None, если размер файла неизвестен)"""
+        if not self.total:
+            return None
+        return min(self.done / self.total, 1.0)
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Оценка оставшегося времени в секундах"""
+        if not self.total or not self.rows_per_second:
+            return None
+        return max(self.total - self.done, 0) / self.rows_per_second
+
+
+@dataclass
+class ImportResult:
+    """Итог импорта: число строк и время этапов"""
+    entity: str
+    total: int = 0
+    imported: int = 0
+    updated: int = 0
+    conflicts: int = 0  # пропущенные строки с уже встреченным ключом, но другими данными
+    timings: dict = field(default_factory=dict)
+
+    @property
+    def skipped(self) -> int:
+        return self.total - self.imported - self.updated
+
+    @property
+    def elapsed(self) -> float:
+        return sum(self.timings.values())
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        """Краткий отчёт для вывода пользователю"""
+        stages = ", ".join(
+            f"{STAGE_LABELS.get(stage, stage)} {seconds:.2f} с" for stage, seconds in self.timings.items()
+        )
+        updated = f", обновлено {self.updated}" if self.updated else ""
+        conflicts = (
+            f"; пропущено с повторным ключом и другими данными: {self.conflicts}"
+            if self.conflicts else ""
+        )
+        return (
+            f"{self.entity}: импортировано {self.imported}{updated} из {self.total} "
+            f"за {self.elapsed:.2f} с ({self.rows_per_second:.0f} строк/с); {stages}{conflicts}"
+        )
+
+
+class Importer(ABC):
+    """Базовый импортёр: общий цикл конвейера и замер этапов"""
+    entity = ""
+    change_entity = None  # запись журнала изменений (change_log) после импорта
+
+    def __init__(
+        self,
+        db: Session,
+        batch_size: int = BATCH_SIZE,
+        on_progress: Optional[Callable[[ImportProgress], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        upsert: bool = False
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.on_progress = on_progress
+        self.cancel_event = cancel_event
+        self.result = ImportResult(self.entity)
+
+    @abstractmethod
+    def normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Приведение колонок пачки к полям модели"""
+
+    def dedupe(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Отбрасывание повторов и уже существующих записей"""
+        return df
+
+    @abstractmethod
+    def write(self, df: pd.DataFrame) -> int:
+        """Запись пачки в базу; возвращает число добавленных строк"""
+
+    def finish(self) -> int:
+        """Запись, отложенная до конца файла; возвращает число добавленных строк"""
+        return 0
+
+    @contextmanager
+    def stage(self, name: str):
+        """Замер времени этапа (суммируется по всем пачкам)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.result.timings[name] = self.result.timings.get(name, 0.0) + time.perf_counter() - started
+
+    def run(self, filepath: str) -> ImportResult:
+        """Импорт файла целиком в одной транзакции
+
+        После каждой пачки вызывается on_progress и проверяется cancel_event:
+        при отмене транзакция откатывается и возбуждается ImportCancelled.
+        """
+        started = time.perf_counter()
+        expected = count_rows(filepath) if self.on_progress else None
+        try:
+            batches = read_source(filepath, self.batch_size)
+            while True:
+                self.check_cancelled()
+                with self.stage("parse"):
+                    df = next(batches, None)
+                if df is None:
+                    break
+                self.result.total += len(df)
+                with self.stage("normalize"):
+                    df = self.normalize(df)
+                with self.stage("dedupe"):
+                    df = self.dedupe(df)
+                if not df.empty:
+                    with self.stage("write"):
+                        self.result.imported += self.write(df)
+                self.report_progress(expected, started)
+            self.report_progress(self.result.total, started, finishing=True)
+            self.check_cancelled()
+            self.result.imported += self.finish()
+            self.check_cancelled()
+            with self.stage("write"):
+                # Одна запись на весь импорт: клиенты перечитывают список целиком
+                if self.change_entity and (self.result.imported or self.result.updated):
+                    log_change(self.db, self.change_entity, None, RELOAD)
+                self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            raise
+        return self.result
+
+    def check_cancelled(self):
+        """Прерывание импорта, если он отменён"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ImportCancelled(f"{self.entity}: импорт отменён")
+
+    def report_progress(self, expected: Optional[int], started: float, finishing: bool = False):
+        """Передача хода импорта в on_progress"""
+        if self.on_progress is None:
+            return
+        total = max(expected, self.result.total) if expected is not None else None
+        self.on_progress(ImportProgress(
+            entity=self.entity,
+            done=self.result.total,
+            total=total,
+            elapsed=time.perf_counter() - started,
+            finishing=finishing
+        ))
+
+    def existing_values(self, column, values) -> set:
+        """Значения из списка, уже присутствующие в колонке таблицы"""
+        values = list(values)
+        found = set()
+        for i in range(0, len(values), self.batch_size):
+            chunk = values[i:i + self.batch_size]
+            found.update(self.db.scalars(select(column).where(column.in_(chunk))))
+        return found
+
+    def existing_hashes(self, key_column, hash_column, keys) -> dict:
+        """Хеши импорта существующих записей по ключу (NULL — запись не из импорта)"""
+        keys = list(keys)
+        hashes = {}
+        for i in range(0, len(keys), self.batch_size):
+            chunk = keys[i:i + self.batch_size]
+            hashes.update(self.db.execute(select(key_column, hash_column).where(key_column.in_(chunk))).all())
+        return hashes
+
+    def split_changed(self, df: pd.DataFrame, key: str, key_column, hash_column) -> pd.DataFrame:
+        """Отбор новых и изменённых строк пачки; колонка is_new отмечает новые
+
+        Без режима upsert существующие записи пропускаются целиком.
+        """
+        existing = self.existing_hashes(key_column, hash_column, df[key])
+        df = df.assign(is_new=~df[key].isin(existing))
+        if not self.upsert:
+            return df[df['is_new']]
+        changed = ~df['is_new'] & (df[key].map(existing) != df['import_hash'])
+        return df[df['is_new'] | changed]
+
+    def upsert_statement(self, model, key: str, columns: list, extra: Optional[Callable] = None):
+        """INSERT ... ON CONFLICT (key) DO UPDATE для текущей СУБД
+
+        columns обновляются значениями новой строки (excluded), extra(excluded, колонки
+        таблицы) возвращает дополнительные выражения. Строка обновляется, только
+        если изменился import_hash.
+        """
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "sqlite":
+            stmt = sqlite.insert(model.__table__)
+        elif dialect == "postgresql":
+            stmt = postgresql.insert(model.__table__)
+        else:
+            raise ValueError(f"Режим обновления не поддерживается для СУБД {dialect}")
+        table = model.__table__
+        set_ = {column: stmt.excluded[column] for column in columns}
+        if extra:
+            set_.update(extra(stmt.excluded, table.c))
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c[key]],
+            set_=set_,
+            where=table.c.import_hash.is_distinct_from(stmt.excluded.import_hash)
+        )
+
+    def resolve_names(self, model, names) -> dict:
+        """Получение id справочника по названиям с созданием недостающих записей"""
+        names = sorted(set(names))
+        ids = {}
+        for i in range(0, len(names), self.batch_size):
+            chunk = names[i:i + self.batch_size]
+            ids.update(self.db.execute(select(model.name, model.id).where(model.name.in_(chunk))).all())
+
+        missing = [name for name in names if name not in ids]
+        if missing:
+            self.insert_rows(model, [{"name": name} for name in missing])
+            for i in range(0, len(missing), self.batch_size):
+                chunk = missing[i:i + self.batch_size]
+                ids.update(self.db.execute(select(model.name, model.id).where(model.name.in_(chunk))).all())
+        return ids
+
+    def insert_rows(self, model, records: list, stmt=None) -> int:
+        """Вставка записей пачками INSERT ... VALUES (или переданным stmt)"""
+        stmt = stmt if stmt is not None else insert(model.__table__)
+        for i in range(0, len(records), self.batch_size):
+            self.db.execute(stmt, records[i:i + self.batch_size])
+        return len(records)
+
+
+def row_hashes(df: pd.DataFrame, columns: list) -> pd.Series:
+    """Хеш значений строки по колонкам (детерминированный между запусками)"""
+    return pd.util.hash_pandas_object(df[columns], index=False).map("{:016x}".format)
+
+
+def frame_records(df: pd.DataFrame, columns: list) -> list:
+    """Строки DataFrame в виде словарей; NaN заменяется на None"""
+    frame = df[columns].astype(object)
+    return frame.where(frame.notna(), None).to_dict("records")
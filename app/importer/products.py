@@ -0,0 +1,147 @@
+"""
+Импорт товаров
+
+Справочники (категории, производители, поставщики) разрешаются одним
+запросом на таблицу для пачки, товары вставляются одним INSERT.
+В режиме upsert изменённые товары обновляются по артикулу.
+"""
+import os
+import shutil
+import pandas as pd
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.importer.normalize import number_column, text_column
+from app.importer.pipeline import ImportResult, Importer, frame_records, row_hashes
+from app.models import Category, Manufacturer, Product, Supplier
+from app.services.change_service import PRODUCT
+from app.services.image_service import UPLOAD_DIR, UPLOAD_URL_PATH
+
+PRODUCT_COLUMNS = [
+    'article', 'name', 'category_id', 'description', 'manufacturer_id', 'supplier_id',
+    'price', 'unit', 'stock_quantity', 'discount_percent', 'image_path', 'import_hash'
+]
+
+# Поля строки файла, изменение которых обновляет товар
+HASH_COLUMNS = [
+    'article', 'name', 'category', 'manufacturer', 'supplier', 'description',
+    'unit', 'price', 'stock_quantity', 'discount_percent', 'image_path'
+]
+
+# Поля, по которым строится артикул товара без артикула в файле. Цена и остаток
+# в него не входят, чтобы при upsert их изменение обновляло товар, а не создавало
+# новый; строки с одинаковыми полями, но разными данными учитываются как конфликты
+GENERATED_ARTICLE_COLUMNS = ['name', 'category', 'manufacturer', 'supplier']
+
+# Колонки, обновляемые значениями из файла при upsert
+UPSERT_COLUMNS = [
+    'name', 'category_id', 'description', 'manufacturer_id', 'supplier_id',
+    'price', 'unit', 'stock_quantity', 'discount_percent', 'import_hash'
+]
+
+
+def upsert_image_columns(excluded, table) -> dict:
+    """Фото при upsert: фото из файла заменяет текущее (и его варианты),
+    если в файле фото нет — загруженное через форму сохраняется"""
+    keep_current = excluded.image_path.is_(None)
+    return {
+        'image_path': func.coalesce(excluded.image_path, table.image_path),
+        'image_hash': case((keep_current, table.image_hash), else_=None),
+        'image_formats': case((keep_current, table.image_formats), else_=None),
+        'updated_at': func.now(),
+    }
+
+
+class ProductsImporter(Importer):
+    """Импорт товаров из Tovar.xlsx или CSV
+
+    Фото ищутся рядом с файлом импорта по номеру из колонки "Фото".
+    """
+    entity = "Товары"
+    change_entity = PRODUCT
+
+    def __init__(self, db: Session, **kwargs):
+        super().__init__(db, **kwargs)
+        self.seen = {}  # артикул -> import_hash первой строки с ним
+        self.copied_images = set()
+        self.images_dir = None
+
+    def run(self, filepath: str) -> ImportResult:
+        self.images_dir = os.path.dirname(filepath)
+        return super().run(filepath)
+
+    def normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Используем поле "Категория товара" (Женская обувь, Мужская обувь)
+        products = pd.DataFrame({
+            'category': text_column(df, 'Категория товара', 'Категория', 'category'),
+            'manufacturer': text_column(df, 'Производитель', 'manufacturer'),
+            'supplier': text_column(df, 'Поставщик', 'supplier'),
+            'article': text_column(df, 'Артикул', 'Артикул товара', 'article'),
+            'name': text_column(df, 'Наименование товара', 'Наименование', 'name'),
+            'description': text_column(df, 'Описание товара', 'Описание', 'description'),
+            'unit': text_column(df, 'Единица измерения', 'unit', default='шт'),
+            'photo': text_column(df, 'Фото', 'photo'),
+            'price': number_column(df, 'Цена', 'price').astype(float),
+            # Сначала float, потом int для обработки "0.0"
+            'stock_quantity': number_column(df, 'Кол-во на складе', 'Количество на складе', 'stock_quantity').astype(int),
+            'discount_percent': number_column(df, 'Действующая скидка', 'Скидка', 'discount_percent').astype(float),
+        })
+        products = products[
+            (products['category'] != '') & (products['manufacturer'] != '') & (products['supplier'] != '')
+        ].copy()
+        products['unit'] = products['unit'].replace('', 'шт')
+        products['description'] = products['description'].replace('', None)
+
+        # Генерируем артикул если не указан: из названия и справочников, а не из номера
+        # строки, чтобы при повторном импорте (и upsert) товар совпал сам с собой,
+        # а не с другим товаром, получившим тот же номер в прошлом файле
+        no_article = products['article'] == ''
+        if no_article.any():
+            products.loc[no_article, 'article'] = "ART-" + row_hashes(products[no_article], GENERATED_ARTICLE_COLUMNS).str[:12]
+
+        # Номер фото без расширения
+        image_num = products['photo'].str.replace(r'\.(jpg|jpeg|png)$', '', regex=True)
+        has_image = image_num.str.isdigit()
+        products['image_num'] = image_num.where(has_image, None)
+        products['image_path'] = None
+        products.loc[has_image, 'image_path'] = f"{UPLOAD_URL_PATH}/" + image_num[has_image] + ".jpg"
+        products['import_hash'] = row_hashes(products, HASH_COLUMNS)
+        return products
+
+    def dedupe(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Проверка уникальности артикула: в файле (включая прошлые пачки) и в базе.
+        # Повтор с теми же данными пропускается молча, с другими — считается конфликтом
+        first = ~df.duplicated('article') & ~df['article'].isin(self.seen.keys())
+        self.seen.update(zip(df.loc[first, 'article'], df.loc[first, 'import_hash']))
+        repeated = df[~first]
+        self.result.conflicts += int((repeated['import_hash'] != repeated['article'].map(self.seen)).sum())
+        df = df[first]
+        return self.split_changed(df, 'article', Product.article, Product.import_hash)
+
+    def write(self, df: pd.DataFrame) -> int:
+        df = df.copy()
+        df['category_id'] = df['category'].map(self.resolve_names(Category, df['category']))
+        df['manufacturer_id'] = df['manufacturer'].map(self.resolve_names(Manufacturer, df['manufacturer']))
+        df['supplier_id'] = df['supplier'].map(self.resolve_names(Supplier, df['supplier']))
+        self.copy_images(set(df['image_num'].dropna()))
+        records = frame_records(df, PRODUCT_COLUMNS)
+        if not self.upsert:
+            return self.insert_rows(Product, records)
+        self.insert_rows(Product, records, self.upsert_statement(Product, 'article', UPSERT_COLUMNS, upsert_image_columns))
+        updated = int((~df['is_new']).sum())
+        self.result.updated += updated
+        return len(records) - updated
+
+    def copy_images(self, image_nums: set):
+        """Копирование фото из папки файла импорта (каждое — один раз)"""
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        for num in image_nums - self.copied_images:
+            self.copied_images.add(num)
+            source = os.path.join(self.images_dir, f"{num}.jpg")
+            if os.path.exists(source):
+                shutil.copy(source, os.path.join(UPLOAD_DIR, f"{num}.jpg"))
+
+
+def import_products(db: Session, filepath: str, **kwargs) -> ImportResult:
+    """Импорт товаров из файла"""
+    return ProductsImporter(db, **kwargs).run(filepath)
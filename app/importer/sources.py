@@ -0,0 +1,103 @@
+"""
+Источники данных для импорта
+
+Файл читается потоково и отдаётся пачками DataFrame фиксированного
+размера, поэтому память расходуется на одну пачку, а не на весь файл.
+
+Excel открывается openpyxl в режиме только для чтения (строки читаются
+по мере разбора XML), CSV — через pd.read_csv с chunksize.
+"""
+from typing import Iterator, Optional
+import os
+import pandas as pd
+from openpyxl import load_workbook
+
+# Размер пачки строк по умолчанию
+BATCH_SIZE = 1000
+
+EXCEL_EXTENSIONS = (".xlsx", ".xlsm")
+CSV_EXTENSIONS = (".csv",)
+
+
+def read_source(filepath: str, batch_size: int = BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    """Чтение файла импорта пачками DataFrame по расширению файла"""
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext in EXCEL_EXTENSIONS:
+        return read_excel_batches(filepath, batch_size)
+    if ext in CSV_EXTENSIONS:
+        return read_csv_batches(filepath, batch_size)
+    raise ValueError(f"Неподдерживаемый формат файла импорта: {ext}")
+
+
+def count_rows(filepath: str) -> Optional[int]:
+    """Примерное число строк данных в файле (для прогресса и оценки времени)
+
+    Для Excel берётся размер листа из его заголовка, для CSV — число переводов строк.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext in EXCEL_EXTENSIONS:
+        workbook = load_workbook(filepath, read_only=True)
+        try:
+            max_row = workbook.worksheets[0].max_row
+        finally:
+            workbook.close()
+        return max(max_row - 1, 0) if max_row else None
+    if ext in CSV_EXTENSIONS:
+        lines = 0
+        with open(filepath, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                lines += chunk.count(b"\n")
+        return max(lines - 1, 0)
+    return None
+
+
+def read_excel_batches(
+    filepath: str,
+    batch_size: int = BATCH_SIZE,
+    sheet_name: Optional[str] = None
+) -> Iterator[pd.DataFrame]:
+    """Чтение листа Excel пачками DataFrame
+
+    Первая непустая строка листа считается заголовком. Индексы строк
+    сквозные по всему файлу, как у pd.read_excel.
+    """
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+
+        header = None
+        for row in rows:
+            if any(value is not None for value in row):
+                header = [str(value).strip() if value is not None else f"Unnamed: {i}" for i, value in enumerate(row)]
+                break
+        if header is None:
+            return
+
+        width = len(header)
+        start = 0
+        batch = []
+        for row in rows:
+            if not any(value is not None for value in row):
+                continue
+            batch.append(row[:width] + (None,) * (width - len(row)))
+            if len(batch) >= batch_size:
+                yield pd.DataFrame(batch, columns=header, index=range(start, start + len(batch)))
+                start += len(batch)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header, index=range(start, start + len(batch)))
+    finally:
+        workbook.close()
+
+
+def read_csv_batches(filepath: str, batch_size: int = BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    """Чтение CSV (UTF-8, с заголовком) пачками DataFrame
+
+    Все значения читаются строками: числа и даты разбираются при нормализации,
+    а ведущие нули в артикулах сохраняются.
+    """
+    with pd.read_csv(filepath, encoding="utf-8", dtype=str, chunksize=batch_size) as reader:
+        for df in reader:
+            df.columns = [str(column).strip() for column in df.columns]
+            yield df
@@ -0,0 +1,82 @@
+"""
+Импорт пользователей
+
+Пароли хешируются в пуле процессов после чтения всего файла, новые
+пользователи вставляются одним пакетом. В режиме upsert у существующих
+пользователей обновляются ФИО и роль; пароль не меняется и в хеш строки
+не входит (быстрый хеш пароля в базе хранить нельзя).
+"""
+import pandas as pd
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from app.importer.normalize import role_column, text_column
+from app.importer.pipeline import ImportResult, Importer, frame_records, row_hashes
+from app.models import User
+from app.services.auth_service import hash_passwords, user_cache
+
+# Поля строки файла, изменение которых обновляет пользователя
+HASH_COLUMNS = ['login', 'full_name', 'role']
+
+
+class UsersImporter(Importer):
+    """Импорт пользователей из user_import.xlsx или CSV"""
+    entity = "Пользователи"
+
+    def __init__(self, db: Session, **kwargs):
+        super().__init__(db, **kwargs)
+        self.seen = set()
+        self.pending = []
+        self.changed = []
+
+    def normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        users = pd.DataFrame({
+            'login': text_column(df, 'Логин', 'login'),
+            'password': text_column(df, 'Пароль', 'password'),
+            'full_name': text_column(df, 'ФИО', 'full_name'),
+            # Обработка роли из поля "Роль сотрудника"
+            'role': role_column(df, 'Роль сотрудника', 'Роль', 'role'),
+        })
+        users = users[(users['login'] != '') & (users['password'] != '')].copy()
+        users['import_hash'] = row_hashes(users, HASH_COLUMNS)
+        return users
+
+    def dedupe(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = df.drop_duplicates('login')
+        df = df[~df['login'].isin(self.seen)]
+        self.seen.update(df['login'])
+        return self.split_changed(df, 'login', User.login, User.import_hash)
+
+    def write(self, df: pd.DataFrame) -> int:
+        # Запись откладывается до конца файла: пароли хешируются одним пулом
+        self.pending.extend(frame_records(df[df['is_new']], ['login', 'password', 'full_name', 'role', 'import_hash']))
+        self.changed.extend(frame_records(df[~df['is_new']], ['login', 'full_name', 'role', 'import_hash']))
+        return 0
+
+    def finish(self) -> int:
+        with self.stage("hash"):
+            hashes = hash_passwords([user.pop('password') for user in self.pending])
+        for user, password_hash in zip(self.pending, hashes):
+            user['password_hash'] = password_hash
+
+        with self.stage("write"):
+            stmt = None
+            if self.upsert:
+                stmt = self.upsert_statement(User, 'login', ['full_name', 'role', 'import_hash'])
+            imported = self.insert_rows(User, self.pending, stmt)
+
+            if self.changed:
+                # Изменённые пользователи обновляются без пароля: UPDATE по логину пачкой
+                self.db.execute(
+                    update(User.__table__).where(User.__table__.c.login == bindparam('b_login')),
+                    [{'b_login': user.pop('login'), **user} for user in self.changed]
+                )
+                # Запись идёт в обход ORM, поэтому кеш пользователей сбрасывается явно
+                user_cache.invalidate()
+                self.result.updated += len(self.changed)
+        return imported
+
+
+def import_users(db: Session, filepath: str, **kwargs) -> ImportResult:
+    """Импорт пользователей из файла"""
+    return UsersImporter(db, **kwargs).run(filepath)
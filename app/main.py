@@ -1,32 +1,44 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
 import os
-from app.database import engine, Base
+from app.database import SessionLocal, engine, init_db
 from app.routers import auth, products, orders
+from app.services.change_service import prune_changes
+from app.services.image_service import cleanup_stale_uploads
+from app.templating import templates
+from app.staticfiles import CachedStaticFiles
 
-# Создание таблиц БД
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="ООО «Обувь»", description="Система управления продажей обуви")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Создание таблиц БД, очистка старого журнала изменений и необработанных
+    загрузок при запуске, закрытие пула подключений при остановке"""
+    init_db()
+    db = SessionLocal()
+    try:
+        prune_changes(db)
+    finally:
+        db.close()
+    cleanup_stale_uploads()
+    yield
+    engine.dispose()
+
+
+app = FastAPI(title="ООО «Обувь»", description="Система управления продажей обуви", lifespan=lifespan)
 
 # Подключение middleware для сессий
 app.add_middleware(SessionMiddleware, secret_key="your-secret-key-change-in-production")
 
 # Подключение статических файлов
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.mount("/static", CachedStaticFiles(directory="app/static"), name="static")
 
 # Подключение роутеров
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(products.router, prefix="/products", tags=["products"])
 app.include_router(orders.router, prefix="/orders", tags=["orders"])
 
-# Инициализация шаблонов
-templates = Jinja2Templates(directory="app/templates")
-
-
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     """Главная страница - окно входа"""
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text, Index, Sequence, event, inspect, select
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -13,6 +13,7 @@ class User(Base):
     password_hash = Column(String(255), nullable=False)
     full_name = Column(String(200), nullable=False)
     role = Column(String(20), nullable=False)  # guest, client, manager, admin
+    import_hash = Column(String(16))  # хеш полей строки файла импорта (без пароля) — обновление только изменённых
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
@@ -61,7 +62,11 @@ class Product(Base):
     unit = Column(String(50), nullable=False)  # единица измерения
     stock_quantity = Column(Integer, nullable=False, default=0)
     image_path = Column(String(500))
+    image_status = Column(String(20))  # processing, ready, failed — обработка загруженного фото
+    image_hash = Column(String(64))  # хеш содержимого фото — префикс имён файлов вариантов
+    image_formats = Column(String(50))  # расширения созданных вариантов: "avif,webp,jpg"
     discount_percent = Column(Float, default=0.0)
+    import_hash = Column(String(16))  # хеш полей строки файла импорта — обновление только изменённых
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -70,6 +75,9 @@ class Product(Base):
     supplier = relationship("Supplier", back_populates="products")
     order_items = relationship("OrderItem", back_populates="product")
 
+    # Индекс для курсорной пагинации с сортировкой по остатку
+    __table_args__ = (Index("ix_products_stock_quantity_id", "stock_quantity", "id"),)
+
 
 class Order(Base):
     """Модель заказа"""
@@ -81,7 +89,8 @@ class Order(Base):
     pickup_address = Column(Text, nullable=False)
     order_date = Column(DateTime(timezone=True), nullable=False)
     delivery_date = Column(DateTime(timezone=True))
-    code = Column(String(10), nullable=False)
+    code = Column(String(10), nullable=False, unique=True, index=True)  # код получения (см. order_service.allocate_order_codes)
+    stock_reserved = Column(Boolean, default=False)  # товар списан со склада при оформлении (у импортированных заказов — нет)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -93,7 +102,7 @@ class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     quantity = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)  # цена на момент заказа
@@ -101,6 +110,38 @@ class OrderItem(Base):
     order = relationship("Order", back_populates="items")
     product = relationship("Product", back_populates="order_items")
 
+    # Индекс для поиска заказов с товаром: "в каких заказах есть товар X"
+    __table_args__ = (Index("ix_order_items_product_id_order_id", "product_id", "order_id"),)
+
+
+class Counter(Base):
+    """Счётчик, выдающий номера блоками (номера кодов заказов в SQLite)"""
+    __tablename__ = "counters"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+# Номера кодов заказов в PostgreSQL (в SQLite — счётчик order_code в counters)
+order_code_sequence = Sequence("order_code_seq", metadata=Base.metadata)
+
+
+class ChangeLog(Base):
+    """Журнал изменений товаров и заказов
+
+    Сервисы добавляют запись в той же транзакции, что и изменение; клиенты
+    запоминают последний прочитанный id и читают только новые записи.
+    """
+    __tablename__ = "change_log"
+
+    id = Column(Integer, primary_key=True)  # возрастает и не переиспользуется после очистки
+    entity = Column(String(20), nullable=False)  # product, order
+    entity_id = Column(Integer)  # пусто — изменено много записей (импорт)
+    action = Column(String(10), nullable=False)  # create, update, delete, reload
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    __table_args__ = {"sqlite_autoincrement": True}
+
 
 class PickupPoint(Base):
     """Модель пункта выдачи"""
@@ -108,3 +149,239 @@ class PickupPoint(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     address = Column(String(500), unique=True, nullable=False)
+
+
+@event.listens_for(Base.metadata, "after_create")
+def add_missing_columns_and_indexes(target, connection, **kw):
+    """Дополнение существующих таблиц новыми колонками и индексами
+
+    create_all не изменяет уже созданные таблицы, поэтому новые nullable-колонки
+    добавляются через ALTER TABLE, а недостающие индексы создаются отдельно.
+    """
+    inspector = inspect(connection)
+    created = {table.name for table in kw.get("tables", [])}
+    for table in target.sorted_tables:
+        if table.name in created or not inspector.has_table(table.name):
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            if index.unique and has_duplicates(connection, index):
+                print(f"Уникальный индекс {index.name} не создан: в таблице {table.name} есть повторы")
+                continue
+            index.create(connection, checkfirst=False)
+
+
+def has_duplicates(connection, index) -> bool:
+    """Есть ли в таблице повторы значений колонок индекса"""
+    columns = list(index.columns)
+    duplicate = select(*columns).group_by(*columns).having(func.count() > 1).limit(1)
+    return connection.execute(duplicate).first() is not None
+
+
+# Полнотекстовый индекс товаров.
+# Таблица products_fts поддерживается триггерами, поэтому индекс остаётся
+# актуальным и при прямых вставках в обход сервисов (импорт из Excel/CSV).
+# SQLite: виртуальная таблица FTS5 (rowid = products.id).
+# PostgreSQL: таблица с колонкой tsvector и GIN-индексом.
+_PRODUCT_SEARCH_SOURCE_SQLITE = """
+    SELECT p.id, p.name, coalesce(p.description, ''), coalesce(c.name, ''),
+           coalesce(m.name, ''), coalesce(s.name, '')
+    FROM products p
+    LEFT JOIN categories c ON c.id = p.category_id
+    LEFT JOIN manufacturers m ON m.id = p.manufacturer_id
+    LEFT JOIN suppliers s ON s.id = p.supplier_id
+"""
+
+_PRODUCT_SEARCH_COLUMNS_SQLITE = "rowid, name, description, category, manufacturer, supplier"
+
+_PRODUCT_SEARCH_DDL_SQLITE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description, category, manufacturer, supplier,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts ({_PRODUCT_SEARCH_COLUMNS_SQLITE})
+        {_PRODUCT_SEARCH_SOURCE_SQLITE} WHERE p.id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_au
+    AFTER UPDATE OF name, description, category_id, manufacturer_id, supplier_id ON products BEGIN
+        DELETE FROM products_fts WHERE rowid = old.id;
+        INSERT INTO products_fts ({_PRODUCT_SEARCH_COLUMNS_SQLITE})
+        {_PRODUCT_SEARCH_SOURCE_SQLITE} WHERE p.id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        DELETE FROM products_fts WHERE rowid = old.id;
+    END
+    """,
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE OF name ON {table} BEGIN
+        UPDATE products_fts SET {column} = new.name
+        WHERE rowid IN (SELECT id FROM products WHERE {column}_id = new.id);
+    END
+    """
+    for table, column in (
+        ("categories", "category"),
+        ("manufacturers", "manufacturer"),
+        ("suppliers", "supplier"),
+    )
+]
+
+_PRODUCT_SEARCH_DDL_POSTGRESQL = [
+    """
+    CREATE TABLE IF NOT EXISTS products_fts (
+        rowid INTEGER PRIMARY KEY REFERENCES products (id) ON DELETE CASCADE,
+        document TSVECTOR NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_fts_document ON products_fts USING GIN (document)",
+    """
+    CREATE OR REPLACE FUNCTION products_fts_document(product_id INTEGER) RETURNS TSVECTOR AS $$
+        SELECT to_tsvector('simple', concat_ws(' ', p.name, p.description, c.name, m.name, s.name))
+        FROM products p
+        LEFT JOIN categories c ON c.id = p.category_id
+        LEFT JOIN manufacturers m ON m.id = p.manufacturer_id
+        LEFT JOIN suppliers s ON s.id = p.supplier_id
+        WHERE p.id = product_id
+    $$ LANGUAGE sql STABLE
+    """,
+    """
+    CREATE OR REPLACE FUNCTION products_fts_refresh_product() RETURNS TRIGGER AS $$
+    BEGIN
+        INSERT INTO products_fts (rowid, document) VALUES (NEW.id, products_fts_document(NEW.id))
+        ON CONFLICT (rowid) DO UPDATE SET document = EXCLUDED.document;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION products_fts_refresh_dimension() RETURNS TRIGGER AS $$
+    BEGIN
+        EXECUTE 'UPDATE products_fts SET document = products_fts_document(rowid) '
+             || 'WHERE rowid IN (SELECT id FROM products WHERE ' || quote_ident(TG_ARGV[0]) || ' = $1)'
+        USING NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS products_fts_refresh ON products",
+    """
+    CREATE TRIGGER products_fts_refresh
+    AFTER INSERT OR UPDATE OF name, description, category_id, manufacturer_id, supplier_id ON products
+    FOR EACH ROW EXECUTE FUNCTION products_fts_refresh_product()
+    """,
+] + [
+    statement
+    for table, column in (
+        ("categories", "category_id"),
+        ("manufacturers", "manufacturer_id"),
+        ("suppliers", "supplier_id"),
+    )
+    for statement in (
+        f"DROP TRIGGER IF EXISTS {table}_fts_refresh ON {table}",
+        f"""
+        CREATE TRIGGER {table}_fts_refresh AFTER UPDATE OF name ON {table}
+        FOR EACH ROW EXECUTE FUNCTION products_fts_refresh_dimension('{column}')
+        """,
+    )
+]
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_product_search_index(target, connection, **kw):
+    """Создание полнотекстового индекса товаров и его первичное заполнение"""
+    dialect = connection.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        return
+
+    index_exists = inspect(connection).has_table("products_fts")
+
+    if dialect == "sqlite":
+        for statement in _PRODUCT_SEARCH_DDL_SQLITE:
+            connection.exec_driver_sql(statement)
+        if not index_exists:
+            # Название товара важнее описания и справочников при ранжировании
+            connection.exec_driver_sql(
+                "INSERT INTO products_fts (products_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 2.0, 2.0, 2.0)')"
+            )
+            connection.exec_driver_sql(
+                f"INSERT INTO products_fts ({_PRODUCT_SEARCH_COLUMNS_SQLITE}) {_PRODUCT_SEARCH_SOURCE_SQLITE}"
+            )
+    else:
+        for statement in _PRODUCT_SEARCH_DDL_POSTGRESQL:
+            connection.exec_driver_sql(statement)
+        if not index_exists:
+            connection.exec_driver_sql(
+                "INSERT INTO products_fts (rowid, document) SELECT id, products_fts_document(id) FROM products"
+            )
+
+
+# Версия справочников (счётчик reference_data в counters) для кеша справочников.
+# Увеличивается триггерами, поэтому меняется при любой записи в справочники,
+# в том числе при импорте и из процессов, не использующих кеш.
+REFERENCE_TABLES = ("categories", "manufacturers", "suppliers", "pickup_points")
+
+_REFERENCE_VERSION_BUMP = "UPDATE counters SET value = value + 1 WHERE name = 'reference_data'"
+
+_REFERENCE_VERSION_DDL_SQLITE = [
+    "INSERT OR IGNORE INTO counters (name, value) VALUES ('reference_data', 1)",
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_version_{suffix} AFTER {operation} ON {table} BEGIN
+        {_REFERENCE_VERSION_BUMP};
+    END
+    """
+    for table in REFERENCE_TABLES
+    for suffix, operation in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE"))
+]
+
+_REFERENCE_VERSION_DDL_POSTGRESQL = [
+    "INSERT INTO counters (name, value) VALUES ('reference_data', 1) ON CONFLICT (name) DO NOTHING",
+    f"""
+    CREATE OR REPLACE FUNCTION reference_version_bump() RETURNS TRIGGER AS $$
+    BEGIN
+        {_REFERENCE_VERSION_BUMP};
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+] + [
+    statement
+    for table in REFERENCE_TABLES
+    for statement in (
+        f"DROP TRIGGER IF EXISTS {table}_version ON {table}",
+        f"""
+        CREATE TRIGGER {table}_version AFTER INSERT OR UPDATE OR DELETE ON {table}
+        FOR EACH STATEMENT EXECUTE FUNCTION reference_version_bump()
+        """,
+    )
+]
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_reference_version_triggers(target, connection, **kw):
+    """Создание триггеров версии справочников"""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        statements = _REFERENCE_VERSION_DDL_SQLITE
+    elif dialect == "postgresql":
+        statements = _REFERENCE_VERSION_DDL_POSTGRESQL
+    else:
+        return
+    for statement in statements:
+        connection.exec_driver_sql(statement)
@@ -2,19 +2,21 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.services.auth_service import authenticate_user
+from app.templating import templates
+from app.services.auth_service import (
+    authenticate_user_async, get_user_identity, get_password_pool_stats, UserIdentity
+)
 from app.schemas import UserLogin, UserResponse
-from app.models import User
 
 router = APIRouter()
 
 
-def get_current_user(request: Request, db: Session = Depends(get_db)) -> User | None:
-    """Получение текущего пользователя из сессии"""
+def get_current_user(request: Request, db: Session = Depends(get_db)) -> UserIdentity | None:
+    """Получение текущего пользователя из сессии (через кеш пользователей)"""
     user_id = request.session.get("user_id")
     if not user_id:
         return None
-    return db.query(User).filter(User.id == user_id).first()
+    return get_user_identity(db, user_id)
 
 
 def require_role(allowed_roles: list[str]):
@@ -48,20 +50,16 @@ async def login(
 ):
     """Авторизация пользователя"""
     try:
-        user = authenticate_user(db, login, password)
+        user = await authenticate_user_async(db, login, password)
         request.session["user_id"] = user.id
         request.session["user_role"] = user.role
         return RedirectResponse(url="/products/", status_code=status.HTTP_303_SEE_OTHER)
     except HTTPException as e:
-        from fastapi.templating import Jinja2Templates
-        templates = Jinja2Templates(directory="app/templates")
         return templates.TemplateResponse("login.html", {
             "request": request,
             "error": e.detail
         })
     except Exception as e:
-        from fastapi.templating import Jinja2Templates
-        templates = Jinja2Templates(directory="app/templates")
         return templates.TemplateResponse("login.html", {
             "request": request,
             "error": f"Ошибка авторизации: {str(e)}"
@@ -75,8 +73,16 @@ async def logout(request: Request):
     return RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
 
 
+@router.get("/password-pool")
+async def password_pool_stats(current_user: UserIdentity | None = Depends(get_current_user)):
+    """Состояние пула проверки паролей (для мониторинга)"""
+    if not current_user or current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Только для администратора")
+    return get_password_pool_stats()
+
+
 @router.get("/me")
-async def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: UserIdentity | None = Depends(get_current_user)):
     """Получение информации о текущем пользователе"""
     if not current_user:
         return None
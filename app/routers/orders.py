@@ -1,12 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
+from typing import Optional
 from datetime import datetime
 from app.database import get_db
-from app.services.order_service import get_orders, get_order, create_order, update_order, delete_order
+from app.templating import templates
+from app.services.order_service import (
+    get_orders_page, get_order, create_order, update_order, delete_order,
+    build_order_items, build_order_update_items, format_order_lines, get_order_by_code, parse_order_lines
+)
 from app.schemas import OrderCreate, OrderUpdate, OrderItemBase
 from app.routers.auth import get_current_user
-from app.models import User, Order
+from app.services.auth_service import UserIdentity
+from app.models import Order
 
 router = APIRouter()
 
@@ -15,21 +21,53 @@ router = APIRouter()
 async def orders_list(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    direction: str = "next",
+    product_id: Optional[int] = None,
+    current_user: Optional[UserIdentity] = Depends(get_current_user)
 ):
-    """Список заказов"""
+    """Список заказов (product_id — только заказы с товаром)"""
     if not current_user or current_user.role not in ["manager", "admin"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Доступ запрещен")
     
-    orders = get_orders(db)
+    try:
+        page = get_orders_page(db, cursor=cursor, direction=direction, product_id=product_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    from fastapi.templating import Jinja2Templates
-    templates = Jinja2Templates(directory="app/templates")
+    return templates.TemplateResponse("orders.html", {
+        "request": request,
+        "orders": page.items,
+        "current_user": current_user,
+        "page_params": {"product_id": product_id} if product_id else {},
+        "cursor": cursor,
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor
+    })
+
+
+@router.get("/pickup", response_class=HTMLResponse)
+async def order_pickup(
+    request: Request,
+    code: str,
+    db: Session = Depends(get_db),
+    current_user: Optional[UserIdentity] = Depends(get_current_user)
+):
+    """Поиск заказа по коду получения при выдаче"""
+    if not current_user or current_user.role not in ["manager", "admin"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Доступ запрещен")
+    
+    order = get_order_by_code(db, code)
+    if not order:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Заказ с таким кодом не найден")
     
     return templates.TemplateResponse("orders.html", {
         "request": request,
-        "orders": orders,
-        "current_user": current_user
+        "orders": [order],
+        "current_user": current_user,
+        "page_params": {},
+        "next_cursor": None,
+        "prev_cursor": None
     })
 
 
@@ -37,15 +75,12 @@ async def orders_list(
 async def order_add_form(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Optional[UserIdentity] = Depends(get_current_user)
 ):
     """Форма добавления заказа"""
     if not current_user or current_user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Только для администратора")
     
-    from fastapi.templating import Jinja2Templates
-    templates = Jinja2Templates(directory="app/templates")
-    
     return templates.TemplateResponse("order_form.html", {
         "request": request,
         "current_user": current_user,
@@ -59,7 +94,7 @@ async def order_edit_form(
     order_id: int,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Optional[UserIdentity] = Depends(get_current_user)
 ):
     """Форма редактирования заказа"""
     if not current_user or current_user.role != "admin":
@@ -69,9 +104,6 @@ async def order_edit_form(
     if not order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Заказ не найден")
     
-    from fastapi.templating import Jinja2Templates
-    templates = Jinja2Templates(directory="app/templates")
-    
     return templates.TemplateResponse("order_form.html", {
         "request": request,
         "current_user": current_user,
@@ -85,11 +117,11 @@ async def order_create(
     request: Request,
     db: Session = Depends(get_db),
     article: str = Form(...),
-    status: str = Form(...),
+    order_status: str = Form(..., alias="status"),
     pickup_address: str = Form(...),
     order_date: str = Form(...),
     delivery_date: str = Form(None),
-    current_user: User = Depends(get_current_user)
+    current_user: Optional[UserIdentity] = Depends(get_current_user)
 ):
     """Создание заказа"""
     if not current_user or current_user.role != "admin":
@@ -101,15 +133,26 @@ async def order_create(
     except Exception:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный формат даты")
     
+    # Позиции заказа из строки артикулов "ART1, QTY1, ART2, QTY2"
+    lines = parse_order_lines(article)
+    try:
+        items = build_order_items(db, lines)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
     order_data = OrderCreate(
-        article=article,
-        status=status,
+        article=format_order_lines(lines),
+        status=order_status,
         pickup_address=pickup_address,
         order_date=order_date_dt,
-        delivery_date=delivery_date_dt
+        delivery_date=delivery_date_dt,
+        items=items
     )
     
-    create_order(db, order_data)
+    try:
+        create_order(db, order_data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     return RedirectResponse(url="/orders/", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -119,11 +162,11 @@ async def order_update(
     request: Request,
     db: Session = Depends(get_db),
     article: str = Form(...),
-    status: str = Form(...),
+    order_status: str = Form(..., alias="status"),
     pickup_address: str = Form(...),
     order_date: str = Form(...),
     delivery_date: str = Form(None),
-    current_user: User = Depends(get_current_user)
+    current_user: Optional[UserIdentity] = Depends(get_current_user)
 ):
     """Обновление заказа"""
     if not current_user or current_user.role != "admin":
@@ -139,15 +182,26 @@ async def order_update(
     except Exception:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный формат даты")
     
+    # Позиции заказа из строки артикулов "ART1, QTY1, ART2, QTY2" (None — состав не изменился)
+    lines = parse_order_lines(article)
+    try:
+        items = build_order_update_items(db, order, lines)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
     order_data = OrderUpdate(
-        article=article,
-        status=status,
+        article=format_order_lines(lines),
+        status=order_status,
         pickup_address=pickup_address,
         order_date=order_date_dt,
-        delivery_date=delivery_date_dt
+        delivery_date=delivery_date_dt,
+        items=items
     )
     
-    update_order(db, order_id, order_data)
+    try:
+        update_order(db, order_id, order_data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     return RedirectResponse(url="/orders/", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -156,7 +210,7 @@ async def order_delete(
     order_id: int,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Optional[UserIdentity] = Depends(get_current_user)
 ):
     """Удаление заказа"""
     if not current_user or current_user.role != "admin":
@@ -2,63 +2,19 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request, Form, Up
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
 from typing import Optional
-import os
-import shutil
-from PIL import Image
 from app.database import get_db
+from app.templating import templates
 from app.services.product_service import (
-    get_products, get_product, create_product, update_product,
-    delete_product, get_categories, get_manufacturers, get_suppliers
+    get_products_page, get_product, create_product, update_product,
+    delete_product, get_categories, get_manufacturers, get_suppliers, is_product_ordered
 )
+from app.services.image_service import save_upload, schedule_product_image, delete_product_images
 from app.schemas import ProductCreate, ProductUpdate
 from app.routers.auth import get_current_user
-from app.models import User
+from app.services.auth_service import UserIdentity
 
 router = APIRouter()
 
-# Директория для сохранения изображений
-UPLOAD_DIR = "app/static/images/products"
-MAX_IMAGE_SIZE = (300, 200)
-
-
-def ensure_upload_dir():
-    """Создание директории для загрузки изображений"""
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-
-def save_image(file: UploadFile, product_id: int) -> str:
-    """Сохранение изображения товара"""
-    ensure_upload_dir()
-    
-    # Получение расширения файла
-    file_ext = os.path.splitext(file.filename)[1]
-    filename = f"product_{product_id}{file_ext}"
-    filepath = os.path.join(UPLOAD_DIR, filename)
-    
-    # Сохранение файла
-    with open(filepath, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Изменение размера изображения
-    try:
-        img = Image.open(filepath)
-        img.thumbnail(MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
-        img.save(filepath)
-    except Exception as e:
-        print(f"Ошибка обработки изображения: {e}")
-    
-    return f"static/images/products/{filename}"
-
-
-def delete_old_image(image_path: str):
-    """Удаление старого изображения"""
-    if image_path and os.path.exists(image_path):
-        try:
-            os.remove(image_path)
-        except Exception as e:
-            print(f"Ошибка удаления изображения: {e}")
-
-
 @router.get("/", response_class=HTMLResponse)
 async def products_list(
     request: Request,
@@ -66,7 +22,9 @@ async def products_list(
     search: Optional[str] = None,
     supplier_id: Optional[str] = None,
     sort_by_stock: Optional[str] = None,
-    current_user: User = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    direction: str = "next",
+    current_user: Optional[UserIdentity] = Depends(get_current_user)
 ):
     """Список товаров"""
     # Определение роли пользователя
@@ -86,20 +44,37 @@ async def products_list(
         supplier_id_int = None
         sort_by_stock = None
     
-    products = get_products(db, search=search, supplier_id=supplier_id_int, sort_by_stock=sort_by_stock)
+    try:
+        page = get_products_page(
+            db,
+            cursor=cursor,
+            direction=direction,
+            search=search,
+            supplier_id=supplier_id_int,
+            sort_by_stock=sort_by_stock
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     suppliers = get_suppliers(db) if role in ["manager", "admin"] else []
     
-    from fastapi.templating import Jinja2Templates
-    templates = Jinja2Templates(directory="app/templates")
-    
     return templates.TemplateResponse("products.html", {
         "request": request,
-        "products": products,
+        "products": page.items,
         "suppliers": suppliers,
         "current_user": current_user,
         "search": search or "",
         "selected_supplier_id": supplier_id_int,
-        "sort_by_stock": sort_by_stock or ""
+        "sort_by_stock": sort_by_stock or "",
+        "page_params": {
+            key: value for key, value in (
+                ("search", search),
+                ("supplier_id", supplier_id_int),
+                ("sort_by_stock", sort_by_stock)
+            ) if value
+        },
+        "cursor": cursor,
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor
     })
 
 
@@ -107,7 +82,7 @@ async def products_list(
 async def product_add_form(
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Optional[UserIdentity] = Depends(get_current_user)
 ):
     """Форма добавления товара"""
     if not current_user or current_user.role != "admin":
@@ -117,9 +92,6 @@ async def product_add_form(
     manufacturers = get_manufacturers(db)
     suppliers = get_suppliers(db)
     
-    from fastapi.templating import Jinja2Templates
-    templates = Jinja2Templates(directory="app/templates")
-    
     return templates.TemplateResponse("product_form.html", {
         "request": request,
         "current_user": current_user,
@@ -135,7 +107,7 @@ async def product_edit_form(
     product_id: int,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Optional[UserIdentity] = Depends(get_current_user)
 ):
     """Форма редактирования товара"""
     if not current_user or current_user.role != "admin":
@@ -149,9 +121,6 @@ async def product_edit_form(
     manufacturers = get_manufacturers(db)
     suppliers = get_suppliers(db)
     
-    from fastapi.templating import Jinja2Templates
-    templates = Jinja2Templates(directory="app/templates")
-    
     return templates.TemplateResponse("product_form.html", {
         "request": request,
         "current_user": current_user,
@@ -176,17 +145,12 @@ async def product_create(
     stock_quantity: int = Form(...),
     discount_percent: float = Form(0.0),
     image: UploadFile = File(None),
-    current_user: User = Depends(get_current_user)
+    current_user: Optional[UserIdentity] = Depends(get_current_user)
 ):
     """Создание товара"""
     if not current_user or current_user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Только для администратора")
     
-    # Получение следующего ID
-    from app.models import Product as ProductModel
-    last_product = db.query(ProductModel).order_by(ProductModel.id.desc()).first()
-    next_id = (last_product.id + 1) if last_product else 1
-    
     product_data = ProductCreate(
         name=name,
         category_id=category_id,
@@ -199,11 +163,13 @@ async def product_create(
         discount_percent=discount_percent
     )
     
-    image_path = None
+    product = create_product(db, product_data)
+    
+    # Изображение обрабатывается в фоне, товар доступен сразу
     if image and image.filename:
-        image_path = save_image(image, next_id)
+        upload_path = await save_upload(image)
+        schedule_product_image(db, product, upload_path)
     
-    product = create_product(db, product_data, image_path)
     return RedirectResponse(url="/products/", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -222,7 +188,7 @@ async def product_update(
     stock_quantity: int = Form(...),
     discount_percent: float = Form(0.0),
     image: UploadFile = File(None),
-    current_user: User = Depends(get_current_user)
+    current_user: Optional[UserIdentity] = Depends(get_current_user)
 ):
     """Обновление товара"""
     if not current_user or current_user.role != "admin":
@@ -244,14 +210,13 @@ async def product_update(
         discount_percent=discount_percent
     )
     
-    image_path = None
+    product = update_product(db, product_id, product_data)
+    
+    # Старое изображение заменяется после фоновой обработки нового
     if image and image.filename:
-        # Удаление старого изображения
-        if product.image_path:
-            delete_old_image(product.image_path)
-        image_path = save_image(image, product_id)
+        upload_path = await save_upload(image)
+        schedule_product_image(db, product, upload_path)
     
-    update_product(db, product_id, product_data, image_path)
     return RedirectResponse(url="/products/", status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -260,7 +225,7 @@ async def product_delete(
     product_id: int,
     request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Optional[UserIdentity] = Depends(get_current_user)
 ):
     """Удаление товара"""
     if not current_user or current_user.role != "admin":
@@ -271,17 +236,17 @@ async def product_delete(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Товар не найден")
     
     # Проверка наличия товара в заказах
-    if product.order_items:
+    if is_product_ordered(db, product_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Невозможно удалить товар, который присутствует в заказе"
         )
     
-    # Удаление изображения
-    if product.image_path:
-        delete_old_image(product.image_path)
+    image = (product.image_path, product.image_hash, product.image_formats)
     
     if delete_product(db, product_id):
+        # Удаление изображения после товара: варианты могут использоваться другими товарами
+        delete_product_images(db, *image)
         return RedirectResponse(url="/products/", status_code=status.HTTP_303_SEE_OTHER)
     else:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ошибка удаления товара")
@@ -148,6 +148,7 @@ class OrderUpdate(BaseModel):
     pickup_address: Optional[str] = None
     order_date: Optional[datetime] = None
     delivery_date: Optional[datetime] = None
+    items: Optional[list[OrderItemBase]] = None
 
 
 class OrderResponse(OrderBase):
@@ -1,7 +1,17 @@
 from passlib.context import CryptContext
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from app.models import User
 from fastapi import HTTPException, status
+from collections import OrderedDict
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+import asyncio
+import os
+import threading
+import time
 
 # Используем pbkdf2_sha256 как основную схему (более надежная, без ограничений bcrypt)
 # и bcrypt как резервную
@@ -12,11 +22,53 @@ pwd_context = CryptContext(
 )
 
 
+# Пул потоков для проверки паролей: PBKDF2 в hashlib отпускает GIL,
+# поэтому потоки считают хеши параллельно, не блокируя цикл событий
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "4"))
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="password")
+_password_tasks = 0
+_password_tasks_lock = threading.Lock()
+
+# Число процессов для массового хеширования паролей при импорте
+PASSWORD_HASH_PROCESSES = int(os.getenv("PASSWORD_HASH_PROCESSES", str(os.cpu_count() or 1)))
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Проверка пароля"""
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Проверка пароля с получением нового хеша, если текущий устарел"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Проверка пароля в пуле потоков (не блокирует цикл событий)"""
+    global _password_tasks
+    with _password_tasks_lock:
+        _password_tasks += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _password_executor, verify_and_update_password, plain_password, hashed_password
+        )
+    finally:
+        with _password_tasks_lock:
+            _password_tasks -= 1
+
+
+def get_password_pool_stats() -> dict:
+    """Состояние пула проверки паролей: размер и глубина очереди"""
+    with _password_tasks_lock:
+        tasks = _password_tasks
+    return {
+        "workers": PASSWORD_WORKERS,
+        "in_progress": min(tasks, PASSWORD_WORKERS),
+        "queued": max(tasks - PASSWORD_WORKERS, 0)
+    }
+
+
 def get_password_hash(password: str) -> str:
     """Хеширование пароля"""
     # Убеждаемся, что пароль - строка
@@ -27,6 +79,17 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def hash_passwords(passwords: list[str], processes: Optional[int] = None) -> list[str]:
+    """Хеширование списка паролей в пуле процессов (порядок сохраняется)"""
+    processes = min(processes or PASSWORD_HASH_PROCESSES, len(passwords))
+    if processes <= 1:
+        return [get_password_hash(password) for password in passwords]
+
+    chunksize = max(1, len(passwords) // (processes * 4))
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(get_password_hash, passwords, chunksize=chunksize))
+
+
 def authenticate_user(db: Session, login: str, password: str) -> User:
     """Аутентификация пользователя"""
     user = db.query(User).filter(User.login == login).first()
@@ -35,11 +98,33 @@ def authenticate_user(db: Session, login: str, password: str) -> User:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный логин или пароль"
         )
-    if not verify_password(password, user.password_hash):
+    valid, new_hash = verify_and_update_password(password, user.password_hash)
+    return _complete_authentication(db, user, valid, new_hash)
+
+
+async def authenticate_user_async(db: Session, login: str, password: str) -> User:
+    """Аутентификация пользователя с проверкой пароля в пуле потоков"""
+    user = db.query(User).filter(User.login == login).first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Неверный логин или пароль"
+        )
+    valid, new_hash = await verify_and_update_password_async(password, user.password_hash)
+    return _complete_authentication(db, user, valid, new_hash)
+
+
+def _complete_authentication(db: Session, user: User, valid: bool, new_hash: Optional[str]) -> User:
+    """Завершение входа: перехеширование устаревшего хеша пароля"""
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный логин или пароль"
         )
+    if new_hash:
+        user.password_hash = new_hash
+        db.commit()
+        db.refresh(user)
     return user
 
 
@@ -47,3 +132,93 @@ def get_user_by_login(db: Session, login: str) -> User | None:
     """Получение пользователя по логину"""
     return db.query(User).filter(User.login == login).first()
 
+
+
+@dataclass(frozen=True)
+class UserIdentity:
+    """Снимок данных пользователя для кеша (без хеша пароля)"""
+    id: int
+    login: str
+    full_name: str
+    role: str
+
+
+class UserCache:
+    """Потокобезопасный LRU-кеш пользователей с ограниченным временем жизни записей"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: OrderedDict[int, tuple[float, UserIdentity]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[UserIdentity]:
+        with self._lock:
+            entry = self._items.get(user_id)
+            if entry is None:
+                return None
+            expires_at, identity = entry
+            if expires_at < time.monotonic():
+                del self._items[user_id]
+                return None
+            self._items.move_to_end(user_id)
+            return identity
+
+    def put(self, identity: UserIdentity):
+        with self._lock:
+            self._items[identity.id] = (time.monotonic() + self.ttl, identity)
+            self._items.move_to_end(identity.id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Удаление записи пользователя (или всего кеша, если id не указан)"""
+        with self._lock:
+            if user_id is None:
+                self._items.clear()
+            else:
+                self._items.pop(user_id, None)
+
+
+user_cache = UserCache(
+    max_size=int(os.getenv("USER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60"))
+)
+
+
+def get_user_identity(db: Session, user_id: int) -> Optional[UserIdentity]:
+    """Получение данных пользователя по ID через кеш"""
+    identity = user_cache.get(user_id)
+    if identity is not None:
+        return identity
+
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        return None
+    identity = UserIdentity(id=user.id, login=user.login, full_name=user.full_name, role=user.role)
+    user_cache.put(identity)
+    return identity
+
+
+@event.listens_for(Session, "after_flush")
+def _remember_changed_users(session, flush_context):
+    """Запоминание пользователей, изменённых в транзакции сессии"""
+    changed = {obj.id for obj in chain(session.new, session.dirty, session.deleted) if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault("changed_user_ids", set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_cached_users(session):
+    """Сброс кеша после фиксации изменений пользователей
+
+    До commit параллельный запрос ещё читает прежние данные и мог бы
+    снова положить их в кеш на весь срок жизни записи.
+    """
+    for user_id in session.info.pop("changed_user_ids", ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_user_ids", None)
@@ -0,0 +1,65 @@
+"""
+Журнал изменений товаров и заказов (таблица change_log)
+
+Сервисы товаров и заказов записывают изменения в журнал в своей
+транзакции: запись появляется только вместе с изменением. Десктоп-клиенты
+опрашивают журнал по id последней прочитанной записи — запрос max(id)
+читает один конец индекса первичного ключа, поэтому опрос почти бесплатен.
+"""
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from app.models import ChangeLog
+from typing import Iterable, Optional
+import os
+
+PRODUCT = "product"
+ORDER = "order"
+
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+RELOAD = "reload"  # изменено много записей сразу: клиенту нужно перечитать список
+
+# Сколько часов хранятся записи журнала
+CHANGE_LOG_RETENTION_HOURS = int(os.getenv("CHANGE_LOG_RETENTION_HOURS", "24"))
+
+
+def log_change(db: Session, entity: str, entity_id: Optional[int], action: str) -> None:
+    """Запись изменения в журнал (commit — на вызывающем)"""
+    db.execute(insert(ChangeLog.__table__).values(entity=entity, entity_id=entity_id, action=action))
+
+
+def log_changes(db: Session, entity: str, entity_ids: Iterable[int], action: str) -> None:
+    """Запись изменений нескольких записей одним пакетным INSERT"""
+    rows = [{"entity": entity, "entity_id": entity_id, "action": action} for entity_id in entity_ids]
+    if rows:
+        db.execute(insert(ChangeLog.__table__), rows)
+
+
+def get_last_change_id(db: Session) -> int:
+    """Id последней записи журнала (0, если журнал пуст)"""
+    return db.scalar(select(func.max(ChangeLog.id))) or 0
+
+
+def get_changes(db: Session, after_id: int, limit: int = 1000) -> list[ChangeLog]:
+    """Записи журнала после after_id по возрастанию id"""
+    return db.scalars(
+        select(ChangeLog).where(ChangeLog.id > after_id).order_by(ChangeLog.id).limit(limit)
+    ).all()
+
+
+def get_changes_by_ids(db: Session, change_ids: Iterable[int]) -> list[ChangeLog]:
+    """Записи журнала по списку id (пропуски, дозаписанные позже)"""
+    change_ids = list(change_ids)
+    if not change_ids:
+        return []
+    return db.scalars(select(ChangeLog).where(ChangeLog.id.in_(change_ids)).order_by(ChangeLog.id)).all()
+
+
+def prune_changes(db: Session, hours: int = CHANGE_LOG_RETENTION_HOURS) -> int:
+    """Удаление записей журнала старше hours часов; возвращает число удалённых"""
+    border = datetime.now(timezone.utc) - timedelta(hours=hours)
+    result = db.execute(delete(ChangeLog.__table__).where(ChangeLog.created_at < border))
+    db.commit()
+    return result.rowcount
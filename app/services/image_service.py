@@ -0,0 +1,222 @@
+"""
+Обработка изображений товаров
+
+Загрузка сохраняется на диск потоково во временный каталог вне
+app/static (исходник клиента никогда не отдаётся как статика), а варианты
+изображения создаются в фоновом пуле потоков, чтобы запрос
+создания/редактирования товара завершался сразу и не блокировал цикл событий.
+
+Для каждого изображения создаются варианты нескольких ширин в форматах
+AVIF/WebP (если поддерживаются Pillow) и JPEG. Имена файлов содержат хеш
+содержимого исходника ({hash}_{ширина}.{расширение}), поэтому файлы
+неизменяемы и отдаются с долгим кешированием (см. app/staticfiles.py).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import UploadFile
+from sqlalchemy.orm import Session
+from PIL import Image, ImageOps, features
+import aiofiles
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from app.database import SessionLocal
+from app.models import Product
+from app.services.change_service import PRODUCT, UPDATE, log_change
+
+# Директория для сохранения изображений
+UPLOAD_DIR = "app/static/images/products"
+UPLOAD_URL_PATH = "static/images/products"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Каталог загруженных исходников до обработки (по умолчанию системный временный)
+# и срок, после которого необработанный исходник удаляется при запуске приложения
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None
+UPLOAD_TMP_PREFIX = "shoe-upload-"
+UPLOAD_STALE_SECONDS = int(os.getenv("UPLOAD_STALE_SECONDS", "3600"))
+
+# Ширины вариантов изображения и ширина для image_path (JPEG по умолчанию)
+IMAGE_WIDTHS = (160, 320, 640)
+DEFAULT_IMAGE_WIDTH = 320
+
+# Форматы вариантов: (имя формата Pillow, расширение, параметры сохранения)
+IMAGE_FORMATS = [
+    (name, ext, options)
+    for name, ext, options in (
+        ("AVIF", "avif", {"quality": 55}),
+        ("WEBP", "webp", {"quality": 80, "method": 4}),
+        ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+    )
+    if name == "JPEG" or features.check(name.lower())
+]
+
+# Статусы обработки изображения товара
+IMAGE_STATUS_PROCESSING = "processing"
+IMAGE_STATUS_READY = "ready"
+IMAGE_STATUS_FAILED = "failed"
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+_image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+
+
+def ensure_upload_dir():
+    """Создание директории для загрузки изображений"""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+
+async def save_upload(file: UploadFile) -> str:
+    """Потоковое сохранение загруженного файла во временный файл
+
+    Файл создаётся вне публичного каталога и без расширения клиента; в
+    UPLOAD_DIR попадают только созданные из него варианты изображения.
+    """
+    if UPLOAD_TMP_DIR:
+        os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    fd, upload_path = tempfile.mkstemp(prefix=UPLOAD_TMP_PREFIX, dir=UPLOAD_TMP_DIR)
+    os.close(fd)
+
+    try:
+        async with aiofiles.open(upload_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await buffer.write(chunk)
+    except BaseException:
+        os.remove(upload_path)
+        raise
+    return upload_path
+
+
+def cleanup_stale_uploads(max_age: int = UPLOAD_STALE_SECONDS) -> int:
+    """Удаление исходников, которые не были обработаны (сбой или остановка приложения)
+
+    Возвращает число удалённых файлов.
+    """
+    upload_dir = UPLOAD_TMP_DIR or tempfile.gettempdir()
+    if not os.path.isdir(upload_dir):
+        return 0
+    border = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(upload_dir):
+        if entry.name.startswith(UPLOAD_TMP_PREFIX) and entry.is_file() and entry.stat().st_mtime < border:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError as e:
+                print(f"Ошибка удаления загрузки {entry.path}: {e}")
+    return removed
+
+
+def variant_filename(image_hash: str, width: int, ext: str) -> str:
+    """Имя файла варианта изображения"""
+    return f"{image_hash}_{width}.{ext}"
+
+
+def file_content_hash(filepath: str) -> str:
+    """Хеш содержимого файла для имени вариантов"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()[:20]
+
+
+def generate_image_variants(source_path: str, image_hash: str) -> list[str]:
+    """Создание вариантов изображения всех ширин и форматов
+
+    Возвращает список созданных форматов (расширений).
+    """
+    ensure_upload_dir()
+    with Image.open(source_path) as img:
+        img = ImageOps.exif_transpose(img)
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+        img = img.convert("RGBA" if has_alpha else "RGB")
+
+        for width in IMAGE_WIDTHS:
+            variant = img.copy()
+            variant.thumbnail((width, width * 2), Image.Resampling.LANCZOS)
+            for name, ext, options in IMAGE_FORMATS:
+                target = os.path.join(UPLOAD_DIR, variant_filename(image_hash, width, ext))
+                if os.path.exists(target):
+                    continue
+                frame = variant
+                if name == "JPEG" and has_alpha:
+                    frame = Image.new("RGB", variant.size, "#FFFFFF")
+                    frame.paste(variant, mask=variant.getchannel("A"))
+                # Запись во временный файл и атомарная замена: клиенты не увидят недописанный файл
+                tmp_target = f"{target}.{uuid.uuid4().hex}.tmp"
+                frame.save(tmp_target, format=name, **options)
+                os.replace(tmp_target, target)
+
+    return [ext for _, ext, _ in IMAGE_FORMATS]
+
+
+def delete_image(image_path: str):
+    """Удаление изображения товара по пути относительно app/"""
+    if not image_path:
+        return
+    filepath = os.path.join("app", image_path)
+    if os.path.exists(filepath):
+        try:
+            os.remove(filepath)
+        except Exception as e:
+            print(f"Ошибка удаления изображения: {e}")
+
+
+def delete_product_images(db: Session, image_path: str, image_hash: str | None, image_formats: str | None):
+    """Удаление изображения товара и его вариантов, если они не используются другими товарами"""
+    if image_hash:
+        if db.query(Product.id).filter(Product.image_hash == image_hash).first():
+            return
+        for width in IMAGE_WIDTHS:
+            for ext in (image_formats or "").split(","):
+                if ext:
+                    delete_image(f"{UPLOAD_URL_PATH}/{variant_filename(image_hash, width, ext)}")
+    elif image_path:
+        delete_image(image_path)
+
+
+def process_product_image(product_id: int, upload_path: str):
+    """Создание вариантов загруженного изображения и привязка их к товару"""
+    db = SessionLocal()
+    try:
+        product = db.query(Product).filter(Product.id == product_id).first()
+        if not product:
+            return
+
+        try:
+            image_hash = file_content_hash(upload_path)
+            formats = generate_image_variants(upload_path, image_hash)
+        except Exception as e:
+            print(f"Ошибка обработки изображения: {e}")
+            product.image_status = IMAGE_STATUS_FAILED
+            db.commit()
+            return
+
+        old_image = (product.image_path, product.image_hash, product.image_formats)
+        product.image_path = f"{UPLOAD_URL_PATH}/{variant_filename(image_hash, DEFAULT_IMAGE_WIDTH, 'jpg')}"
+        product.image_hash = image_hash
+        product.image_formats = ",".join(formats)
+        product.image_status = IMAGE_STATUS_READY
+        log_change(db, PRODUCT, product_id, UPDATE)
+        db.commit()
+
+        if old_image[1] != image_hash:
+            delete_product_images(db, *old_image)
+    finally:
+        db.close()
+        if os.path.exists(upload_path):
+            os.remove(upload_path)
+
+
+def schedule_product_image(db: Session, product: Product, upload_path: str):
+    """Постановка обработки изображения товара в фоновую очередь"""
+    product.image_status = IMAGE_STATUS_PROCESSING
+    db.commit()
+    try:
+        _image_executor.submit(process_product_image, product.id, upload_path)
+    except RuntimeError:
+        # Пул остановлен (завершение приложения): исходник не будет обработан
+        os.remove(upload_path)
+        product.image_status = IMAGE_STATUS_FAILED
+        db.commit()
+        raise
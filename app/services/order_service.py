@@ -1,14 +1,77 @@
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.orm import Session
-from app.models import Order, OrderItem
-from app.schemas import OrderCreate, OrderUpdate
+from app.models import Counter, Order, OrderItem, Product, order_code_sequence
+from app.schemas import OrderCreate, OrderItemBase, OrderUpdate
+from app.services.pagination import Page, PAGE_SIZE, paginate
+from app.services.change_service import ORDER, PRODUCT, CREATE, UPDATE, DELETE, log_change, log_changes
 from typing import Optional
-import random
-import string
+import hashlib
+import os
 
+# Отменённый заказ не держит товар на складе, товар выполненного — выдан
+CANCELLED_STATUS = "отменен"
+COMPLETED_STATUS = "выполнен"
 
-def generate_order_code() -> str:
-    """Генерация 6-значного кода заказа"""
-    return ''.join(random.choices(string.digits, k=6))
+
+# Коды получения: номер из счётчика, переставленный ключом в коде из ORDER_CODE_DIGITS цифр.
+# Перестановка взаимно однозначна, поэтому коды не повторяются без проверок в базе;
+# после 10^7 заказов коды удлиняются на цифру. Старые коды (6 цифр и коды из файлов
+# импорта короче 7 цифр) с новыми не пересекаются.
+ORDER_CODE_DIGITS = 7
+ORDER_CODE_KEY = os.getenv("ORDER_CODE_KEY", "shoe-store-order-code").encode()
+ORDER_CODE_ROUNDS = 6
+
+
+def _code_round(round_index: int, value: int, modulus: int) -> int:
+    """Раундовая функция перестановки кодов"""
+    digest = hashlib.blake2b(f"{round_index}:{value}".encode(), key=ORDER_CODE_KEY, digest_size=8).digest()
+    return int.from_bytes(digest, "big") % modulus
+
+
+def encode_order_code(number: int) -> str:
+    """Код получения по номеру из счётчика (сеть Фейстеля на 10^digits значений)"""
+    digits = max(ORDER_CODE_DIGITS, len(str(number)))
+    left_size = 10 ** (digits // 2)
+    right_size = 10 ** (digits - digits // 2)
+    value = number
+    for round_index in range(ORDER_CODE_ROUNDS):
+        left, right = divmod(value, right_size)
+        value = left_size * right + (left + _code_round(round_index, right, left_size)) % left_size
+        left_size, right_size = right_size, left_size
+    return str(value).zfill(digits)
+
+
+def is_generated_code(code: str) -> bool:
+    """Код в формате выдаваемых кодов (такие коды из файлов импорта не сохраняются)"""
+    return code.isdigit() and len(code) >= ORDER_CODE_DIGITS
+
+
+def allocate_order_codes(db: Session, count: int = 1) -> list[str]:
+    """Выдача count новых кодов получения одним запросом к счётчику
+
+    PostgreSQL — последовательность order_code_seq, SQLite — строка order_code
+    в таблице counters (номера выдаются блоком до конца транзакции).
+    """
+    if count <= 0:
+        return []
+    if db.get_bind().dialect.name == "postgresql":
+        numbers = db.scalars(select(order_code_sequence.next_value()).select_from(func.generate_series(1, count)))
+    else:
+        counters = Counter.__table__
+        last = db.scalar(
+            update(counters).where(counters.c.name == "order_code")
+            .values(value=counters.c.value + count).returning(counters.c.value)
+        )
+        if last is None:
+            db.execute(insert(counters).values(name="order_code", value=count))
+            last = count
+        numbers = range(last - count + 1, last + 1)
+    return [encode_order_code(number) for number in numbers]
+
+
+def get_order_by_code(db: Session, code: str) -> Order | None:
+    """Заказ по коду получения (уникальный индекс ix_orders_code)"""
+    return db.query(Order).filter(Order.code == code.strip()).first()
 
 
 def get_orders(db: Session, skip: int = 0, limit: int = 100):
@@ -16,11 +79,173 @@ def get_orders(db: Session, skip: int = 0, limit: int = 100):
     return db.query(Order).offset(skip).limit(limit).all()
 
 
+def get_orders_page(
+    db: Session,
+    cursor: Optional[str] = None,
+    direction: str = "next",
+    limit: int = PAGE_SIZE,
+    product_id: Optional[int] = None
+) -> Page:
+    """Страница списка заказов с курсорной пагинацией по id
+
+    product_id — только заказы, содержащие товар.
+    """
+    query = db.query(Order)
+    if product_id is not None:
+        query = query.filter(Order.id.in_(select(OrderItem.order_id).where(OrderItem.product_id == product_id)))
+    return paginate(query, Order.id, Order.id, cursor=cursor, direction=direction, limit=limit)
+
+
+def get_orders_by_ids(db: Session, order_ids: list[int]) -> list[Order]:
+    """Заказы по списку id"""
+    if not order_ids:
+        return []
+    return db.query(Order).filter(Order.id.in_(order_ids)).all()
+
+
 def get_order(db: Session, order_id: int) -> Order | None:
     """Получение заказа по ID"""
     return db.query(Order).filter(Order.id == order_id).first()
 
 
+def parse_order_lines(article: str) -> list[tuple[str, int]]:
+    """Разбор строки артикулов заказа "ART1, QTY1, ART2, QTY2" в пары (артикул, количество)
+
+    Артикул без количества в конце строки считается одной штукой,
+    пары с неверным количеством пропускаются.
+    """
+    parts = [part.strip() for part in (article or '').split(',') if part.strip()]
+    lines = []
+    for i in range(0, len(parts), 2):
+        if i + 1 == len(parts):
+            lines.append((parts[i], 1))
+            break
+        try:
+            quantity = int(parts[i + 1])
+        except ValueError:
+            continue
+        if quantity > 0:
+            lines.append((parts[i], quantity))
+    return lines
+
+
+def format_order_lines(lines) -> str:
+    """Строка артикулов заказа "ART1, QTY1, ART2, QTY2" для отображения"""
+    return ', '.join(f"{article}, {quantity}" for article, quantity in lines)
+
+
+def get_product_prices(db: Session, articles) -> dict:
+    """id и цена со скидкой товаров по артикулам одним запросом: {артикул: (id, цена)}"""
+    articles = set(articles)
+    if not articles:
+        return {}
+    rows = db.execute(
+        select(Product.article, Product.id, Product.price, Product.discount_percent)
+        .where(Product.article.in_(articles))
+    )
+    return {
+        article: (product_id, round(price * (1 - (discount or 0) / 100), 2))
+        for article, product_id, price, discount in rows
+    }
+
+
+def build_order_items(db: Session, lines: list[tuple[str, int]], kept_prices: Optional[dict] = None) -> list[OrderItemBase]:
+    """Позиции заказа по парам (артикул, количество) с ценой товара на момент заказа
+
+    kept_prices — {артикул: цена} товаров, цена которых не пересчитывается
+    (уже заказанные товары изменяемого заказа).
+    """
+    if not lines:
+        raise ValueError("Добавьте хотя бы один товар")
+    kept_prices = kept_prices or {}
+    products = get_product_prices(db, [article for article, _ in lines])
+    items = []
+    for article, quantity in lines:
+        if article not in products:
+            raise ValueError(f"Товар с артикулом {article} не найден")
+        product_id, price = products[article]
+        items.append(OrderItemBase(product_id=product_id, quantity=quantity, price=kept_prices.get(article, price)))
+    return items
+
+
+def build_order_update_items(db: Session, order: Order, lines: list[tuple[str, int]]) -> Optional[list[OrderItemBase]]:
+    """Новые позиции изменяемого заказа или None, если состав заказа не изменился
+
+    Без изменений позиции не пересобираются: сохраняются цены на момент заказа,
+    а заказ с удалёнными из каталога товарами можно редактировать (статус, даты).
+    Уже заказанные товары сохраняют свою цену, по текущей считаются только новые.
+    """
+    if lines and lines in (get_order_lines(db, order.id), parse_order_lines(order.article)):
+        return None
+    kept_prices = dict(db.execute(
+        select(Product.article, OrderItem.price).join(OrderItem.product).where(OrderItem.order_id == order.id)
+    ).all())
+    return build_order_items(db, lines, kept_prices)
+
+
+def insert_order_items(db: Session, order_id: int, items: list[OrderItemBase]) -> None:
+    """Вставка позиций заказа одним пакетным INSERT"""
+    if items:
+        db.execute(insert(OrderItem.__table__), [
+            {"order_id": order_id, **item.dict()} for item in items
+        ])
+
+
+def item_quantities(items) -> dict:
+    """Количество по товарам: {product_id: quantity} (повторы товара суммируются)"""
+    quantities = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return quantities
+
+
+def reserve_stock(db: Session, items) -> None:
+    """Резервирование товара на складе под позиции заказа
+
+    Остаток уменьшается одним условным UPDATE на товар (stock_quantity >= количества),
+    поэтому параллельные заказы не продают больше, чем есть. В PostgreSQL UPDATE
+    блокирует строку товара и перепроверяет условие после ожидания. Товары
+    обновляются по возрастанию id, чтобы встречные заказы не блокировали друг друга.
+    Нехватка — ValueError; откат транзакции — на вызывающем.
+    """
+    products = Product.__table__
+    quantities = sorted(item_quantities(items).items())
+    for product_id, quantity in quantities:
+        result = db.execute(
+            update(products)
+            .where(products.c.id == product_id, products.c.stock_quantity >= quantity)
+            .values(stock_quantity=products.c.stock_quantity - quantity)
+        )
+        if result.rowcount != 1:
+            article = db.scalar(select(Product.article).where(Product.id == product_id))
+            raise ValueError(f"Недостаточно товара {article or product_id} на складе")
+    log_changes(db, PRODUCT, [product_id for product_id, _ in quantities], UPDATE)
+
+
+def release_stock(db: Session, items) -> None:
+    """Возврат на склад товара из позиций заказа"""
+    products = Product.__table__
+    quantities = sorted(item_quantities(items).items())
+    for product_id, quantity in quantities:
+        db.execute(
+            update(products)
+            .where(products.c.id == product_id)
+            .values(stock_quantity=products.c.stock_quantity + quantity)
+        )
+    log_changes(db, PRODUCT, [product_id for product_id, _ in quantities], UPDATE)
+
+
+def get_order_lines(db: Session, order_id: int) -> list[tuple[str, int]]:
+    """Позиции заказа в виде пар (артикул, количество)"""
+    rows = db.execute(
+        select(Product.article, OrderItem.quantity)
+        .join(OrderItem.product)
+        .where(OrderItem.order_id == order_id)
+        .order_by(OrderItem.id)
+    )
+    return [(article, quantity) for article, quantity in rows]
+
+
 def create_order(db: Session, order: OrderCreate) -> Order:
     """Создание нового заказа"""
     db_order = Order(
@@ -28,23 +253,24 @@ def create_order(db: Session, order: OrderCreate) -> Order:
         status=order.status,
         pickup_address=order.pickup_address,
         order_date=order.order_date,
-        delivery_date=order.delivery_date,
-        code=generate_order_code()
+        delivery_date=order.delivery_date
     )
-    db.add(db_order)
-    db.flush()
-
-    # Добавление позиций заказа
-    for item in order.items:
-        db_item = OrderItem(
-            order_id=db_order.id,
-            product_id=item.product_id,
-            quantity=item.quantity,
-            price=item.price
-        )
-        db.add(db_item)
+    try:
+        # Резерв товара, код и заказ — в одной транзакции
+        if order.status != CANCELLED_STATUS:
+            reserve_stock(db, order.items)
+            db_order.stock_reserved = True
+        db_order.code = allocate_order_codes(db)[0]
+        db.add(db_order)
+        db.flush()
 
-    db.commit()
+        # Добавление позиций заказа
+        insert_order_items(db, db_order.id, order.items)
+        log_change(db, ORDER, db_order.id, CREATE)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     db.refresh(db_order)
     return db_order
 
@@ -56,10 +282,40 @@ def update_order(db: Session, order_id: int, order: OrderUpdate) -> Order:
         return None
 
     update_data = order.dict(exclude_unset=True)
+    update_data.pop("items", None)
+    # Товар выполненного заказа выдан: его резерв на складе уже не держится
+    held = bool(db_order.stock_reserved) and db_order.status != COMPLETED_STATUS
+    was_cancelled = db_order.status == CANCELLED_STATUS
     for field, value in update_data.items():
         setattr(db_order, field, value)
+    cancelled = db_order.status == CANCELLED_STATUS
+    resumed = was_cancelled and not cancelled
 
-    db.commit()
+    try:
+        # Резерв пересчитывается при замене позиций зарезервированного заказа, при его
+        # отмене и при возобновлении отменённого. Заказы без резерва (импортированные,
+        # выполненные) склад не затрагивают
+        if (held and (order.items is not None or cancelled)) or resumed:
+            old_items = list(db_order.items)
+            if held:
+                release_stock(db, old_items)
+            if not cancelled:
+                reserve_stock(db, order.items if order.items is not None else old_items)
+            db_order.stock_reserved = not cancelled
+
+        # При выполнении резерв расходуется и больше не возвращается на склад
+        if db_order.status == COMPLETED_STATUS:
+            db_order.stock_reserved = False
+
+        # Позиции заказа заменяются целиком
+        if order.items is not None:
+            db.execute(delete(OrderItem.__table__).where(OrderItem.order_id == order_id))
+            insert_order_items(db, order_id, order.items)
+        log_change(db, ORDER, order_id, UPDATE)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     db.refresh(db_order)
     return db_order
 
@@ -70,7 +326,43 @@ def delete_order(db: Session, order_id: int) -> bool:
     if not db_order:
         return False
 
+    # Зарезервированный товар незавершённого заказа возвращается на склад
+    if db_order.stock_reserved and db_order.status != COMPLETED_STATUS:
+        release_stock(db, db_order.items)
     db.delete(db_order)
+    log_change(db, ORDER, order_id, DELETE)
     db.commit()
     return True
 
+
+def backfill_order_items(db: Session, batch_size: int = 1000) -> tuple[int, int]:
+    """Заполнение позиций заказов без order_items из строки артикулов
+
+    Заказы обрабатываются пачками по id. Цена берётся текущая: цена на момент
+    старых заказов не сохранилась. Артикулы, которых нет среди товаров,
+    пропускаются. Возвращает число заказов и позиций; commit — на вызывающем.
+    """
+    has_items = select(OrderItem.id).where(OrderItem.order_id == Order.id).exists()
+    last_id = 0
+    orders_count = items_count = 0
+    while True:
+        rows = db.execute(
+            select(Order.id, Order.article).where(Order.id > last_id, ~has_items).order_by(Order.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        lines = {order_id: parse_order_lines(article) for order_id, article in rows}
+        products = get_product_prices(db, {article for order_lines in lines.values() for article, _ in order_lines})
+        records = [
+            {"order_id": order_id, "product_id": products[article][0], "quantity": quantity, "price": products[article][1]}
+            for order_id, order_lines in lines.items()
+            for article, quantity in order_lines
+            if article in products
+        ]
+        if records:
+            db.execute(insert(OrderItem.__table__), records)
+        orders_count += len({record["order_id"] for record in records})
+        items_count += len(records)
+    return orders_count, items_count
@@ -0,0 +1,107 @@
+"""
+Курсорная (keyset) пагинация списков
+
+Страница выбирается условием по (колонка сортировки, id) вместо OFFSET,
+поэтому стоимость любой страницы одинакова независимо от её номера.
+"""
+from dataclasses import dataclass, field
+from typing import Optional
+import base64
+import json
+
+from sqlalchemy import tuple_, literal
+
+# Размер страницы по умолчанию
+PAGE_SIZE = 20
+
+
+@dataclass
+class Page:
+    """Страница списка с курсорами соседних страниц"""
+    items: list = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
+def encode_cursor(values: list) -> str:
+    """Кодирование значений ключа в непрозрачный курсор"""
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """Декодирование курсора в значения ключа"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise ValueError("Неверный курсор страницы")
+    # Значения курсора подставляются в запрос: только числа и строки
+    if not isinstance(values, list) or not all(
+        isinstance(value, (int, float, str)) and not isinstance(value, bool) for value in values
+    ):
+        raise ValueError("Неверный курсор страницы")
+    return values
+
+
+def cursor_value_matches(column, value) -> bool:
+    """Подходит ли значение курсора к типу колонки ключа"""
+    try:
+        expected = column.type.python_type
+    except NotImplementedError:
+        return True
+    if expected is float:
+        expected = (int, float)
+    return isinstance(value, expected)
+
+
+def paginate(
+    query,
+    sort_column,
+    id_column,
+    descending: bool = False,
+    cursor: Optional[str] = None,
+    direction: str = "next",
+    limit: int = PAGE_SIZE
+) -> Page:
+    """Выборка страницы запроса по ключу (sort_column, id_column)
+
+    direction="next" возвращает строки после курсора, "prev" — перед ним.
+    """
+    if direction not in ("next", "prev"):
+        raise ValueError("Неверное направление пагинации")
+
+    columns = [id_column] if sort_column is id_column else [sort_column, id_column]
+    backwards = direction == "prev"
+    reverse = descending != backwards
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(columns) or not all(map(cursor_value_matches, columns, values)):
+            raise ValueError("Неверный курсор страницы")
+        if len(columns) == 1:
+            key, bound = columns[0], values[0]
+        else:
+            key, bound = tuple_(*columns), tuple_(*[literal(value) for value in values])
+        query = query.filter(key < bound if reverse else key > bound)
+
+    query = query.order_by(*[c.desc() if reverse else c.asc() for c in columns])
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return Page()
+
+    def key_of(item):
+        return [getattr(item, c.key) for c in columns]
+
+    has_next = True if backwards else has_more
+    has_prev = has_more if backwards else bool(cursor)
+    return Page(
+        items=rows,
+        next_cursor=encode_cursor(key_of(rows[-1])) if has_next else None,
+        prev_cursor=encode_cursor(key_of(rows[0])) if has_prev else None
+    )
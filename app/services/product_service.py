@@ -1,46 +1,157 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
-from app.models import Product, Category, Manufacturer, Supplier, PickupPoint
+from sqlalchemy.orm import Session, contains_eager, selectinload
+from sqlalchemy import or_, and_, exists, func, text, table, column
+from app.models import Product, Category, Manufacturer, Supplier, OrderItem
 from app.schemas import ProductCreate, ProductUpdate
+from app.services.pagination import Page, PAGE_SIZE, paginate
+from app.services.change_service import PRODUCT, CREATE, UPDATE, DELETE, log_change
+from app.services.reference_service import get_reference_data
 from typing import Optional
+import re
 
+# Полнотекстовый индекс товаров (см. app/models.py)
+products_fts = table("products_fts", column("rowid"), column("rank"), column("document"))
 
-def get_products(
+
+def apply_product_search(query, db: Session, search: str):
+    """Фильтрация запроса товаров по полнотекстовому индексу.
+
+    Каждое слово поискового запроса ищется как префикс в названии, описании,
+    категории, производителе и поставщике. Возвращает запрос и выражение
+    для сортировки по релевантности (None, если индекс недоступен).
+    """
+    terms = re.findall(r"\w+", search.lower())
+    if not terms:
+        return query, None
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        query = query.join(products_fts, products_fts.c.rowid == Product.id).filter(
+            text("products_fts MATCH :search_match").bindparams(search_match=match)
+        )
+        return query, products_fts.c.rank.asc()
+
+    if dialect == "postgresql":
+        ts_query = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        query = query.join(products_fts, products_fts.c.rowid == Product.id).filter(
+            products_fts.c.document.op("@@")(ts_query)
+        )
+        return query, func.ts_rank(products_fts.c.document, ts_query).desc()
+
+    # Прочие СУБД: поиск подстроки без индекса
+    query = query.filter(
+        or_(
+            Product.name.ilike(f"%{search}%"),
+            Product.description.ilike(f"%{search}%"),
+            Product.category.has(Category.name.ilike(f"%{search}%")),
+            Product.manufacturer.has(Manufacturer.name.ilike(f"%{search}%")),
+            Product.supplier.has(Supplier.name.ilike(f"%{search}%"))
+        )
+    )
+    return query, None
+
+
+def build_products_query(
     db: Session,
-    skip: int = 0,
-    limit: int = 100,
     search: Optional[str] = None,
     supplier_id: Optional[int] = None,
-    sort_by_stock: Optional[str] = None
+    eager: Optional[str] = "joined"
 ):
-    """Получение списка товаров с фильтрацией, поиском и сортировкой"""
-    # Используем outerjoin для случаев, когда связанные данные могут отсутствовать
-    query = db.query(Product).outerjoin(Category).outerjoin(Manufacturer).outerjoin(Supplier)
+    """Запрос товаров с поиском и фильтрацией по поставщику
+
+    eager задаёт загрузку категории, производителя и поставщика:
+    "joined" — в том же запросе через outer join, "selectin" — тремя
+    дополнительными запросами на всю выборку, None — лениво.
+    Возвращает запрос и выражение сортировки по релевантности поиска.
+    """
+    query = db.query(Product)
+
+    # Загрузка связанных справочников без N+1 запросов при отображении
+    if eager == "joined":
+        query = query.outerjoin(Product.category).outerjoin(Product.manufacturer).outerjoin(Product.supplier).options(
+            contains_eager(Product.category),
+            contains_eager(Product.manufacturer),
+            contains_eager(Product.supplier)
+        )
+    elif eager == "selectin":
+        query = query.options(
+            selectinload(Product.category),
+            selectinload(Product.manufacturer),
+            selectinload(Product.supplier)
+        )
 
-    # Поиск по текстовым полям
+    # Полнотекстовый поиск по текстовым полям
+    rank_order = None
     if search:
-        search_filter = or_(
-            Product.name.ilike(f"%{search}%"),
-            Product.description.ilike(f"%{search}%"),
-            Category.name.ilike(f"%{search}%"),
-            Manufacturer.name.ilike(f"%{search}%"),
-            Supplier.name.ilike(f"%{search}%")
-        )
-        query = query.filter(search_filter)
+        query, rank_order = apply_product_search(query, db, search)
 
     # Фильтрация по поставщику
     if supplier_id:
         query = query.filter(Product.supplier_id == supplier_id)
 
+    return query, rank_order
+
+
+def get_products(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    search: Optional[str] = None,
+    supplier_id: Optional[int] = None,
+    sort_by_stock: Optional[str] = None,
+    ranked: bool = False,
+    eager: Optional[str] = "joined"
+):
+    """Получение списка товаров с фильтрацией, поиском и сортировкой
+
+    ranked=True упорядочивает результаты поиска по релевантности,
+    если не задана сортировка по остатку.
+    """
+    query, rank_order = build_products_query(db, search=search, supplier_id=supplier_id, eager=eager)
+
     # Сортировка по количеству на складе
     if sort_by_stock == "asc":
         query = query.order_by(Product.stock_quantity.asc())
     elif sort_by_stock == "desc":
         query = query.order_by(Product.stock_quantity.desc())
+    elif ranked and rank_order is not None:
+        query = query.order_by(rank_order)
 
     return query.offset(skip).limit(limit).all()
 
 
+def get_products_page(
+    db: Session,
+    cursor: Optional[str] = None,
+    direction: str = "next",
+    limit: int = PAGE_SIZE,
+    search: Optional[str] = None,
+    supplier_id: Optional[int] = None,
+    sort_by_stock: Optional[str] = None,
+    eager: Optional[str] = "joined"
+) -> Page:
+    """Страница списка товаров с курсорной пагинацией по (остаток, id) или id"""
+    query, _ = build_products_query(db, search=search, supplier_id=supplier_id, eager=eager)
+    sort_column = Product.stock_quantity if sort_by_stock in ("asc", "desc") else Product.id
+    return paginate(
+        query,
+        sort_column,
+        Product.id,
+        descending=sort_by_stock == "desc",
+        cursor=cursor,
+        direction=direction,
+        limit=limit
+    )
+
+
+def get_products_by_ids(db: Session, product_ids: list[int]) -> list[Product]:
+    """Товары по списку id с загруженными справочниками"""
+    if not product_ids:
+        return []
+    query, _ = build_products_query(db)
+    return query.filter(Product.id.in_(product_ids)).all()
+
+
 def get_product(db: Session, product_id: int) -> Product | None:
     """Получение товара по ID"""
     return db.query(Product).filter(Product.id == product_id).first()
@@ -50,6 +161,8 @@ def create_product(db: Session, product: ProductCreate, image_path: Optional[str
     """Создание нового товара"""
     db_product = Product(**product.dict(), image_path=image_path)
     db.add(db_product)
+    db.flush()
+    log_change(db, PRODUCT, db_product.id, CREATE)
     db.commit()
     db.refresh(db_product)
     return db_product
@@ -73,11 +186,17 @@ def update_product(
     for field, value in update_data.items():
         setattr(db_product, field, value)
 
+    log_change(db, PRODUCT, product_id, UPDATE)
     db.commit()
     db.refresh(db_product)
     return db_product
 
 
+def is_product_ordered(db: Session, product_id: int) -> bool:
+    """Есть ли товар в заказах (EXISTS по индексу order_items.product_id)"""
+    return db.query(exists().where(OrderItem.product_id == product_id)).scalar()
+
+
 def delete_product(db: Session, product_id: int) -> bool:
     """Удаление товара"""
     db_product = get_product(db, product_id)
@@ -85,32 +204,33 @@ def delete_product(db: Session, product_id: int) -> bool:
         return False
 
     # Проверка наличия товара в заказах
-    if db_product.order_items:
+    if is_product_ordered(db, product_id):
         return False
 
     db.delete(db_product)
+    log_change(db, PRODUCT, product_id, DELETE)
     db.commit()
     return True
 
 
 def get_categories(db: Session):
-    """Получение всех категорий"""
-    return db.query(Category).all()
+    """Получение всех категорий (из кеша справочников)"""
+    return list(get_reference_data(db).categories)
 
 
 def get_manufacturers(db: Session):
-    """Получение всех производителей"""
-    return db.query(Manufacturer).all()
+    """Получение всех производителей (из кеша справочников)"""
+    return list(get_reference_data(db).manufacturers)
 
 
 def get_suppliers(db: Session):
-    """Получение всех поставщиков"""
-    return db.query(Supplier).all()
+    """Получение всех поставщиков (из кеша справочников)"""
+    return list(get_reference_data(db).suppliers)
 
 
 def get_pickup_points(db: Session):
-    """Получение всех пунктов выдачи"""
-    return db.query(PickupPoint).all()
+    """Получение всех пунктов выдачи (из кеша справочников)"""
+    return list(get_reference_data(db).pickup_points)
 
 
 def get_product_by_article(db: Session, article: str) -> Product | None:
@@ -0,0 +1,126 @@
+"""
+Кеш справочников: категории, производители, поставщики, пункты выдачи
+
+Справочники меняются редко, а читаются на каждой странице товаров и в
+каждой форме товара или заказа. Кеш хранит их снимок в памяти процесса
+вместе с версией — счётчиком reference_data в таблице counters, который
+увеличивают триггеры справочников (app/models.py). Изменение через ORM
+сбрасывает кеш своего процесса сразу после commit; другие процессы
+(веб-приложение, десктоп-клиенты, импорт) сверяют версию не чаще раза
+в REFERENCE_CACHE_CHECK_INTERVAL секунд.
+"""
+from dataclasses import dataclass
+from itertools import chain
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.models import Category, Counter, Manufacturer, PickupPoint, Supplier
+from typing import Optional
+import os
+import threading
+import time
+
+# Имя счётчика версии справочников в таблице counters
+REFERENCE_VERSION_COUNTER = "reference_data"
+
+# Период сверки версии с базой (с): столько может устаревать кеш после
+# изменения справочника в другом процессе
+REFERENCE_CACHE_CHECK_INTERVAL = float(os.getenv("REFERENCE_CACHE_CHECK_INTERVAL", "5"))
+
+
+@dataclass(frozen=True)
+class ReferenceItem:
+    """Запись справочника (категория, производитель, поставщик)"""
+    id: int
+    name: str
+
+
+@dataclass(frozen=True)
+class PickupPointItem:
+    """Пункт выдачи"""
+    id: int
+    address: str
+
+
+@dataclass(frozen=True)
+class ReferenceData:
+    """Снимок всех справочников одной версии"""
+    version: int
+    categories: tuple
+    manufacturers: tuple
+    suppliers: tuple
+    pickup_points: tuple
+
+
+def get_reference_version(db) -> int:
+    """Текущая версия справочников в базе"""
+    counters = Counter.__table__
+    return db.scalar(select(counters.c.value).where(counters.c.name == REFERENCE_VERSION_COUNTER)) or 0
+
+
+def load_reference_data(db: Session) -> ReferenceData:
+    """Чтение справочников из базы"""
+    version = get_reference_version(db)
+    return ReferenceData(
+        version=version,
+        categories=tuple(ReferenceItem(*row) for row in db.execute(select(Category.id, Category.name).order_by(Category.id))),
+        manufacturers=tuple(ReferenceItem(*row) for row in db.execute(select(Manufacturer.id, Manufacturer.name).order_by(Manufacturer.id))),
+        suppliers=tuple(ReferenceItem(*row) for row in db.execute(select(Supplier.id, Supplier.name).order_by(Supplier.id))),
+        pickup_points=tuple(PickupPointItem(*row) for row in db.execute(select(PickupPoint.id, PickupPoint.address).order_by(PickupPoint.id)))
+    )
+
+
+class ReferenceCache:
+    """Потокобезопасный кеш справочников с проверкой версии по базе"""
+
+    def __init__(self, check_interval: float = REFERENCE_CACHE_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._data: Optional[ReferenceData] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> ReferenceData:
+        """Справочники из кеша; после check_interval версия сверяется одним запросом"""
+        with self._lock:
+            data = self._data
+            if data is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return data
+            if data is None or get_reference_version(db) != data.version:
+                data = load_reference_data(db)
+            self._data = data
+            self._checked_at = time.monotonic()
+            return data
+
+    def invalidate(self):
+        """Сброс кеша (справочник изменён в этом процессе)"""
+        with self._lock:
+            self._data = None
+
+
+reference_cache = ReferenceCache()
+
+
+def get_reference_data(db: Session) -> ReferenceData:
+    """Все справочники через кеш"""
+    return reference_cache.get(db)
+
+
+REFERENCE_MODELS = (Category, Manufacturer, Supplier, PickupPoint)
+
+
+@event.listens_for(Session, "after_flush")
+def _remember_reference_changes(session, flush_context):
+    """Отметка сессии, изменившей справочники"""
+    if any(isinstance(obj, REFERENCE_MODELS) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info["reference_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_reference_cache(session):
+    """Сброс кеша после фиксации изменений справочников"""
+    if session.info.pop("reference_changed", False):
+        reference_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_reference_changes(session):
+    session.info.pop("reference_changed", None)
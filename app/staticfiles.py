@@ -0,0 +1,25 @@
+"""
+Раздача статических файлов с заголовками кеширования
+
+Варианты изображений товаров называются по хешу содержимого, поэтому
+их можно кешировать в браузере навсегда. Остальные файлы отдаются
+с обычной проверкой актуальности (ETag/Last-Modified).
+"""
+import re
+from fastapi.staticfiles import StaticFiles
+
+# Имена файлов вида {hash}_{ширина}.{расширение} — неизменяемое содержимое
+IMMUTABLE_FILE_PATTERN = re.compile(r"(^|/)[0-9a-f]{20}_\d+\.(avif|webp|jpg)$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class CachedStaticFiles(StaticFiles):
+    """Статические файлы с долгим кешированием файлов с хешем в имени"""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if IMMUTABLE_FILE_PATTERN.search(scope["path"]):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers.setdefault("Cache-Control", "no-cache")
+        return response
@@ -0,0 +1,65 @@
+"""
+Общее окружение шаблонов Jinja2
+
+Окружение создаётся один раз на процесс: скомпилированные шаблоны
+кешируются в памяти, а байт-код — на диске между перезапусками.
+
+Переменные окружения:
+    TEMPLATES_AUTO_RELOAD=0         — не проверять изменения файлов шаблонов
+    TEMPLATES_BYTECODE_CACHE_DIR    — каталог кеша байт-кода (по умолчанию временный)
+    TEMPLATES_PRECOMPILED_DIR       — загружать шаблоны, заранее скомпилированные
+                                      в модули Python (python -m app.templating <каталог>)
+"""
+import os
+import sys
+from fastapi.templating import Jinja2Templates
+from jinja2 import ChoiceLoader, Environment, FileSystemBytecodeCache, FileSystemLoader, ModuleLoader
+from app.services.image_service import IMAGE_WIDTHS
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+
+def create_environment() -> Environment:
+    """Создание окружения Jinja2 с кешированием"""
+    loader = FileSystemLoader(TEMPLATES_DIR)
+    auto_reload = os.getenv("TEMPLATES_AUTO_RELOAD", "1") != "0"
+
+    precompiled_dir = os.getenv("TEMPLATES_PRECOMPILED_DIR")
+    if precompiled_dir:
+        if not os.path.isdir(precompiled_dir):
+            compile_templates(precompiled_dir)
+        # Скомпилированные модули не перечитываются, поэтому исходники — только запасной вариант
+        loader = ChoiceLoader([ModuleLoader(precompiled_dir), loader])
+        auto_reload = False
+
+    bytecode_cache_dir = os.getenv("TEMPLATES_BYTECODE_CACHE_DIR")
+    if bytecode_cache_dir:
+        os.makedirs(bytecode_cache_dir, exist_ok=True)
+
+    env = Environment(
+        loader=loader,
+        autoescape=True,
+        auto_reload=auto_reload,
+        bytecode_cache=FileSystemBytecodeCache(bytecode_cache_dir),
+        cache_size=-1
+    )
+    env.globals["image_widths"] = IMAGE_WIDTHS
+    return env
+
+
+def compile_templates(target_dir: str):
+    """Предварительная компиляция всех шаблонов в модули Python"""
+    env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=True)
+    env.compile_templates(target_dir, zip=None, ignore_errors=False)
+
+
+# Общий экземпляр шаблонов для всех роутеров
+templates = Jinja2Templates(env=create_environment())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Использование: python -m app.templating <каталог>")
+        sys.exit(1)
+    compile_templates(sys.argv[1])
+    print(f"Шаблоны скомпилированы в {sys.argv[1]}")
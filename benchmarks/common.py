@@ -0,0 +1,41 @@
+"""
+Общие функции скриптов замеров: база данных замера и тестовый каталог
+
+Модули app читают DATABASE_URL при импорте, поэтому use_database()
+вызывается до их импорта.
+"""
+import os
+import sys
+import tempfile
+
+# Добавление корневой директории проекта в путь
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def use_database(database_url: str = None, name: str = "bench.db") -> str:
+    """DATABASE_URL замера; без адреса — новый файл SQLite во временном каталоге
+
+    Переданная база должна быть пустой: замер создаёт в ней таблицы и данные.
+    """
+    if not database_url:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="shoe-bench-"), name)
+    os.environ["DATABASE_URL"] = database_url
+    return database_url
+
+
+def seed_catalog(db, count: int, stock: int) -> None:
+    """Справочники и count товаров (артикулы P00001...) с остатком stock"""
+    from sqlalchemy import insert
+    from app.models import Category, Manufacturer, Product, Supplier
+
+    for model in (Category, Manufacturer, Supplier):
+        db.execute(insert(model.__table__).values(id=1, name="Замер"))
+    db.execute(insert(Product.__table__), [
+        {
+            "article": f"P{i:05d}", "name": f"Товар {i}", "category_id": 1, "manufacturer_id": 1,
+            "supplier_id": 1, "price": 100.0, "unit": "шт.", "stock_quantity": stock
+        }
+        for i in range(1, count + 1)
+    ])
+    db.commit()
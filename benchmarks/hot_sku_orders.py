@@ -0,0 +1,120 @@
+"""
+Замер: параллельные заказы одного товара
+
+Потоки одновременно оформляют заказы по одной штуке одного товара.
+Сравниваются прежняя схема (чтение остатка, проверка, запись) и
+create_order с условным UPDATE остатка (order_service.reserve_stock).
+Согласованность: продано + осталось = начальный остаток и продано не больше
+остатка.
+
+    python benchmarks/hot_sku_orders.py
+    python benchmarks/hot_sku_orders.py --threads 16 --stock 500 100000
+"""
+import argparse
+import threading
+import time
+from datetime import datetime
+
+from common import seed_catalog, use_database
+
+ROW = "{:>8} | {:<18} | {:>7} | {:>8} | {:>6} | {:>6} | {:<12} | {:>9}"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8, help="потоков-покупателей (8)")
+    parser.add_argument("--orders", type=int, default=100, help="заказов на поток (100)")
+    parser.add_argument("--stock", type=int, nargs="+", default=[500, 100000], help="начальные остатки товара")
+    parser.add_argument("--database-url", help="пустая база для замера (по умолчанию временный файл SQLite)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    use_database(args.database_url, "hot_sku.db")
+
+    from sqlalchemy import delete, func, select, update
+    from app.database import SessionLocal, init_db
+    from app.models import Order, OrderItem, Product
+    from app.schemas import OrderCreate, OrderItemBase
+    from app.services.order_service import allocate_order_codes, create_order, insert_order_items
+
+    init_db()
+    db = SessionLocal()
+    seed_catalog(db, 1, 0)
+    product_id = db.scalar(select(Product.id))
+
+    def new_order():
+        return OrderCreate(
+            article="P00001, 1", status="новый", pickup_address="Пункт выдачи", order_date=datetime.now(),
+            items=[OrderItemBase(product_id=product_id, quantity=1, price=100.0)]
+        )
+
+    def read_check_write(session, order):
+        """Прежняя схема: остаток проверяется чтением и записывается отдельно"""
+        product = session.get(Product, product_id)
+        if product.stock_quantity < 1:
+            raise ValueError("Недостаточно товара")
+        product.stock_quantity = product.stock_quantity - 1
+        db_order = Order(
+            article=order.article, status=order.status, pickup_address=order.pickup_address,
+            order_date=order.order_date, code=allocate_order_codes(session)[0]
+        )
+        session.add(db_order)
+        session.flush()
+        insert_order_items(session, db_order.id, order.items)
+        session.commit()
+
+    def conditional_update(session, order):
+        create_order(session, order)
+
+    def run(place_order, stock):
+        db.execute(delete(OrderItem.__table__))
+        db.execute(delete(Order.__table__))
+        db.execute(update(Product.__table__).values(stock_quantity=stock))
+        db.commit()
+
+        counts = {"ok": 0, "rejected": 0, "errors": 0}
+        lock = threading.Lock()
+
+        def worker():
+            session = SessionLocal()
+            for _ in range(args.orders):
+                try:
+                    place_order(session, new_order())
+                    result = "ok"
+                except ValueError:
+                    session.rollback()
+                    result = "rejected"
+                except Exception:
+                    session.rollback()
+                    result = "errors"
+                with lock:
+                    counts[result] += 1
+            session.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        db.expire_all()
+        sold = db.scalar(select(func.coalesce(func.sum(OrderItem.quantity), 0)))
+        left = db.scalar(select(Product.stock_quantity).where(Product.id == product_id))
+        consistent = sold + left == stock and sold <= stock
+        print(ROW.format(stock, place_order.__name__, sold, left, counts["rejected"], counts["errors"],
+                         "да" if consistent else "НЕТ", f"{counts['ok'] / elapsed:.0f}"))
+
+    print(f"{args.threads} потоков x {args.orders} заказов, {db.get_bind().dialect.name}")
+    print(ROW.format("Остаток", "Схема", "Продано", "Осталось", "Отказы", "Ошибки", "Согласованно", "Заказов/с"))
+    for stock in args.stock:
+        for place_order in (read_check_write, conditional_update):
+            run(place_order, stock)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
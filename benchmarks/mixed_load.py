@@ -0,0 +1,141 @@
+"""
+Замер: одновременные запись и чтение одного файла SQLite
+
+Отдельные процессы работают с одной базой, как веб-приложение и
+десктоп-клиенты. Сравниваются профили SQLITE_PROFILE в двух сценариях:
+    web    — 2 процесса оформляют заказы, 2 читают страницы товаров;
+    import — 1 процесс пишет транзакции по 20 000 строк (импорт из
+             десктоп-клиента), 2 читают страницы товаров.
+
+    python benchmarks/mixed_load.py
+    python benchmarks/mixed_load.py --duration 10 --profiles production
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from common import seed_catalog
+
+# Процессы сценариев: w — заказы, r — чтение страниц товаров, i — импорт
+SCENARIOS = {"web": "wwrr", "import": "irr"}
+IMPORT_ROWS = 20000
+STARTUP_DELAY = 5  # с на запуск процессов до начала замера
+ROW = "{:<10} | {:<8} | {:>9} | {:>10} | {:>8} | {:>11} | {:>6}"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=6, help="длительность сценария, с (6)")
+    parser.add_argument("--profiles", nargs="+", default=["default", "production"], help="профили SQLITE_PROFILE")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--products", type=int, default=5000, help="товаров в каталоге (5000)")
+    return parser.parse_args()
+
+
+def setup(products: int):
+    """Создание базы замера (в отдельном процессе, с PRAGMA профиля)"""
+    from app.database import SessionLocal, init_db
+    init_db()
+    db = SessionLocal()
+    seed_catalog(db, products, 10 ** 6)
+    db.close()
+
+
+def worker(kind: str, products: int, start_at: float, stop_at: float, results):
+    from sqlalchemy import insert
+    from app.database import SessionLocal
+    from app.models import Order
+    from app.schemas import OrderCreate, OrderItemBase
+    from app.services.order_service import allocate_order_codes, create_order
+    from app.services.product_service import get_products_page
+
+    db = SessionLocal()
+    latencies = []
+    errors = 0
+    time.sleep(max(0.0, start_at - time.time()))
+    window_start = time.time()
+    while time.time() < stop_at:
+        started = time.perf_counter()
+        try:
+            if kind == "w":
+                create_order(db, OrderCreate(
+                    article="P, 1", status="новый", pickup_address="Пункт выдачи", order_date=datetime.now(),
+                    items=[OrderItemBase(product_id=random.randint(1, products), quantity=1, price=100.0)]
+                ))
+            elif kind == "i":
+                # Длинная транзакция записи, как импорт заказов из файла
+                codes = allocate_order_codes(db, IMPORT_ROWS)
+                db.execute(insert(Order.__table__), [
+                    {"article": "P00001, 1", "status": "новый", "pickup_address": "Пункт выдачи",
+                     "order_date": datetime.now(), "code": code}
+                    for code in codes
+                ])
+                time.sleep(0.3)
+                db.commit()
+            else:
+                get_products_page(
+                    db,
+                    sort_by_stock="asc" if random.random() < 0.5 else None,
+                    search="товар 1" if random.random() < 0.3 else None
+                )
+                db.rollback()
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            db.rollback()
+            errors += 1
+    db.close()
+    results.put((kind, latencies, errors, time.time() - window_start))
+
+
+def run(profile: str, scenario: str, args) -> list:
+    """Один сценарий на новой базе; строки результата по типу нагрузки"""
+    os.environ["SQLITE_PROFILE"] = profile
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="shoe-bench-"), "mixed.db")
+    process = multiprocessing.Process(target=setup, args=(args.products,))
+    process.start()
+    process.join()
+
+    results = multiprocessing.Queue()
+    start_at = time.time() + STARTUP_DELAY
+    stop_at = start_at + args.duration
+    processes = [
+        multiprocessing.Process(target=worker, args=(kind, args.products, start_at, stop_at, results))
+        for kind in SCENARIOS[scenario]
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    def stats(kinds):
+        """Операций в секунду (сумма по процессам), p95 задержки и число ошибок"""
+        rows = [row for row in collected if row[0] in kinds]
+        latencies = sorted(latency for _, values, _, _ in rows for latency in values)
+        rate = sum(len(values) / elapsed for _, values, _, elapsed in rows)
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+        return rate, p95, sum(errors for _, _, errors, _ in rows)
+
+    writes, write_p95, write_errors = stats("wi")
+    reads, read_p95, read_errors = stats("r")
+    return ROW.format(
+        profile, scenario, f"{writes:.1f}", f"{write_p95:.1f} мс", f"{reads:.0f}", f"{read_p95:.1f} мс",
+        write_errors + read_errors
+    )
+
+
+def main():
+    args = parse_args()
+    print(f"{args.products} товаров, {args.duration:g} с на сценарий; import — транзакции по {IMPORT_ROWS} строк")
+    print(ROW.format("Профиль", "Сценарий", "Записей/с", "p95 записи", "Чтений/с", "p95 чтения", "Ошибки"))
+    for scenario in args.scenarios:
+        for profile in args.profiles:
+            print(run(profile, scenario, args))
+
+
+if __name__ == "__main__":
+    main()
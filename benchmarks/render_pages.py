@@ -0,0 +1,93 @@
+"""
+Замер: время ответа страниц с шаблонами Jinja2
+
+Страницы запрашиваются через TestClient от имени менеджера. Сравниваются
+общее окружение шаблонов (app/templating.py) и прежняя схема, в которой
+обработчик создавал Jinja2Templates и заново компилировал шаблон при
+каждом запросе.
+
+    python benchmarks/render_pages.py
+    python benchmarks/render_pages.py --requests 1000 --pages /products/ /products/add
+"""
+import argparse
+import time
+from datetime import datetime
+
+from common import seed_catalog, use_database
+
+ROW = "{:<16} | {:<11} | {:>13}"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300, help="запросов на страницу (300)")
+    parser.add_argument("--rows", type=int, default=20, help="товаров и заказов в базе (20)")
+    parser.add_argument("--pages", nargs="+", default=["/products/", "/orders/"])
+    parser.add_argument("--database-url", help="пустая база для замера (по умолчанию временный файл SQLite)")
+    return parser.parse_args()
+
+
+def seed(rows: int):
+    from sqlalchemy import insert
+    from app.database import SessionLocal, init_db
+    from app.models import Order, PickupPoint, User
+    from app.services.auth_service import get_password_hash
+    from app.services.order_service import allocate_order_codes
+
+    init_db()
+    db = SessionLocal()
+    seed_catalog(db, rows, 5)
+    db.add(User(login="manager", password_hash=get_password_hash("manager"), full_name="Менеджер", role="manager"))
+    db.add(PickupPoint(address="Пункт выдачи"))
+    db.execute(insert(Order.__table__), [
+        {"article": f"P{i:05d}, 1", "status": "новый", "pickup_address": "Пункт выдачи",
+         "order_date": datetime(2025, 1, 1), "code": code}
+        for i, code in enumerate(allocate_order_codes(db, rows), start=1)
+    ])
+    db.commit()
+    db.close()
+
+
+def per_request_templates(templates):
+    """Прежняя схема: новое окружение Jinja2 на каждый ответ"""
+    from fastapi.templating import Jinja2Templates
+    from app.templating import TEMPLATES_DIR
+
+    def template_response(*args, **kwargs):
+        fresh = Jinja2Templates(directory=TEMPLATES_DIR)
+        fresh.env.globals.update(templates.env.globals)
+        return fresh.TemplateResponse(*args, **kwargs)
+    return template_response
+
+
+def main():
+    args = parse_args()
+    use_database(args.database_url, "render.db")
+    seed(args.rows)
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.templating import templates
+
+    shared_response = templates.TemplateResponse
+    variants = {"shared": shared_response, "per_request": per_request_templates(templates)}
+
+    print(f"{args.rows} товаров и заказов, {args.requests} запросов на страницу")
+    print(ROW.format("Страница", "Окружение", "мс на запрос"))
+    with TestClient(app) as client:
+        client.post("/auth/login", data={"login": "manager", "password": "manager"}, follow_redirects=False)
+        for page in args.pages:
+            for name, template_response in variants.items():
+                templates.TemplateResponse = template_response
+                for _ in range(20):
+                    assert client.get(page).status_code == 200
+                started = time.perf_counter()
+                for _ in range(args.requests):
+                    client.get(page)
+                elapsed = (time.perf_counter() - started) / args.requests
+                print(ROW.format(page, name, f"{elapsed * 1000:.2f}"))
+    templates.TemplateResponse = shared_response
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@
 """
 import flet as ft
 from app.database import SessionLocal
-from app.services.auth_service import verify_password, get_user_by_login
+from app.services.auth_service import verify_and_update_password, get_user_by_login
 from desktop.notifications import show_error, show_warning, show_info
 
 
@@ -44,8 +44,14 @@ def create_login_view(page: ft.Page, app_state):
                 user = get_user_by_login(db, login)
                 if not user:
                     raise ValueError("Неверный логин или пароль")
-                if not verify_password(password, user.password_hash):
+                valid, new_hash = verify_and_update_password(password, user.password_hash)
+                if not valid:
                     raise ValueError("Неверный логин или пароль")
+                # Перехеширование устаревшего хеша пароля
+                if new_hash:
+                    user.password_hash = new_hash
+                    db.commit()
+                    db.refresh(user)
                 
                 app_state.set_user(user)
                 
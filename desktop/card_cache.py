@@ -0,0 +1,102 @@
+"""
+Кэш карточек списков десктопного приложения
+
+Карточка записи хранится по id вместе с версией записи (updated_at, а для
+ни разу не изменённых — created_at). При обновлении списка карточки
+неизменившихся записей переиспользуются: Flet сравнивает списки элементов
+управления и отправляет клиенту только новые, удалённые и перестроенные
+карточки. Каждая карточка обёрнута в постоянный контейнер, поэтому
+у изменённой записи заменяется только содержимое её контейнера.
+"""
+import threading
+import flet as ft
+
+
+def record_version(record):
+    """Версия записи для сравнения карточек"""
+    return record.updated_at or record.created_at
+
+
+class CardCache:
+    """Карточки записей по id
+
+    build_card(record) строит карточку записи; version(record) — значение,
+    изменение которого означает, что карточку нужно перестроить. Методы можно
+    вызывать из разных потоков (загрузка списка, лента изменений).
+    """
+
+    def __init__(self, build_card, version=record_version):
+        self.build_card = build_card
+        self.version = version
+        self._slots = {}  # id -> (версия, контейнер карточки)
+        self._lock = threading.RLock()
+
+    def __contains__(self, record_id: int) -> bool:
+        return record_id in self._slots
+
+    def card(self, record, force: bool = False) -> ft.Container:
+        """Контейнер карточки записи; карточка перестраивается, только если запись изменилась"""
+        version = self.version(record)
+        with self._lock:
+            cached = self._slots.get(record.id)
+            if cached is not None and cached[0] == version and not force:
+                return cached[1]
+            content = self.build_card(record)
+            if cached is None:
+                slot = ft.Container(content=content, data=record.id)
+            else:
+                slot = cached[1]
+                slot.content = content
+            self._slots[record.id] = (version, slot)
+            return slot
+
+    def sync(self, container, records: list, append: bool = False) -> list:
+        """Карточки записей в container.controls в порядке records
+
+        append=True добавляет карточки в конец списка (следующая страница),
+        пропуская уже показанные записи; иначе список заменяется, а карточки
+        пропавших записей забываются.
+        """
+        with self._lock:
+            slots = []
+            for record in records:
+                if append and record.id in self._slots:
+                    continue
+                try:
+                    slots.append(self.card(record))
+                except Exception as e:
+                    print(f"Ошибка при обработке записи {record.id}: {e}")
+            if append:
+                container.controls.extend(slots)
+            else:
+                keep = {record.id for record in records}
+                for record_id in [record_id for record_id in self._slots if record_id not in keep]:
+                    del self._slots[record_id]
+                container.controls[:] = slots
+            return slots
+
+    def patch(self, record):
+        """Перестроение карточки изменённой записи на месте
+
+        Возвращает контейнер карточки для slot.update() или None, если
+        карточки записи нет в списке.
+        """
+        with self._lock:
+            if record.id not in self._slots:
+                return None
+            return self.card(record, force=True)
+
+    def remove(self, container, record_id: int) -> bool:
+        """Удаление карточки записи из списка"""
+        with self._lock:
+            cached = self._slots.pop(record_id, None)
+            if cached is None:
+                return False
+            if cached[1] in container.controls:
+                container.controls.remove(cached[1])
+            return True
+
+    def clear(self):
+        """Забыть все карточки (список заменён сообщением)"""
+        with self._lock:
+            self._slots.clear()
@@ -0,0 +1,132 @@
+"""
+Лента изменений для экранов десктопного приложения
+
+Фоновый поток раз в CHANGE_POLL_INTERVAL секунд сравнивает id последней
+записи журнала change_log с прочитанным. Пока изменений нет, опрос — один
+запрос max(id). Новые записи передаются подписавшимся экранам, которые
+обновляют только затронутые карточки. Так экраны видят изменения,
+сделанные в веб-приложении и другими десктоп-клиентами.
+
+В PostgreSQL id записи выдаётся последовательностью при вставке, а видна
+запись становится при commit, поэтому записи могут появляться не по
+порядку id: пока транзакция с id 10 не завершена, уже видна запись 11.
+Пропущенные id запоминаются и перечитываются при следующих опросах в
+течение CHANGE_GAP_TIMEOUT секунд — за это время транзакция с записью
+журнала либо фиксируется, либо откатывается (и id не появится никогда).
+В SQLite записи пишутся под блокировкой базы и пропусков не бывает.
+"""
+import os
+import threading
+import time
+
+from app.database import SessionLocal
+from app.services.change_service import get_changes, get_changes_by_ids, get_last_change_id
+
+# Период опроса журнала изменений (с)
+CHANGE_POLL_INTERVAL = float(os.getenv("CHANGE_POLL_INTERVAL", "1"))
+
+# Сколько секунд перечитываются пропущенные id журнала (незавершённые транзакции)
+CHANGE_GAP_TIMEOUT = float(os.getenv("CHANGE_GAP_TIMEOUT", "60"))
+
+
+class ChangeFeed:
+    """Опрос журнала изменений с доставкой записей подписчикам
+
+    callback(changes) вызывается в фоновом потоке со списком новых записей
+    журнала одной сущности (product, order) по возрастанию id.
+    """
+
+    def __init__(self, interval: float = CHANGE_POLL_INTERVAL, gap_timeout: float = CHANGE_GAP_TIMEOUT):
+        self.interval = interval
+        self.gap_timeout = gap_timeout
+        self.last_id = 0
+        self._gaps = {}  # пропущенный id -> время, когда пропуск замечен
+        self._subscribers = []  # (entity, callback)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, entity: str, callback):
+        """Подписка на изменения сущности entity (начиная с текущего момента)"""
+        with self._lock:
+            if not self._subscribers:
+                db = SessionLocal()
+                try:
+                    self.last_id = get_last_change_id(db)
+                finally:
+                    db.close()
+                self._gaps.clear()
+            self._subscribers.append((entity, callback))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="change-feed")
+                self._thread.start()
+
+    def unsubscribe(self, callback):
+        """Отписка (при уходе с экрана)"""
+        with self._lock:
+            self._subscribers = [(entity, cb) for entity, cb in self._subscribers if cb is not callback]
+
+    def poll(self):
+        """Чтение новых записей журнала и передача их подписчикам"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            if not subscribers:
+                return
+            db = SessionLocal()
+            try:
+                if not self._gaps and get_last_change_id(db) <= self.last_id:
+                    return
+                changes = get_changes(db, self.last_id)
+                filled = get_changes_by_ids(db, self._gaps)
+            finally:
+                db.close()
+            changes = self._track_gaps(changes, filled)
+            if not changes:
+                return
+
+        for entity, callback in subscribers:
+            entity_changes = [change for change in changes if change.entity == entity]
+            if not entity_changes:
+                continue
+            try:
+                callback(entity_changes)
+            except Exception as e:
+                print(f"Ошибка обработки изменений {entity}: {e}")
+                import traceback
+                traceback.print_exc()
+
+    def _track_gaps(self, changes: list, filled: list) -> list:
+        """Учёт пропусков id; новые записи и дозаписанные пропуски по возрастанию id"""
+        now = time.monotonic()
+        for change in filled:
+            self._gaps.pop(change.id, None)
+        expected = self.last_id + 1
+        for change in changes:
+            for missing_id in range(expected, change.id):
+                self._gaps[missing_id] = now
+            expected = change.id + 1
+        if changes:
+            self.last_id = changes[-1].id
+        # Пропуск, не заполненный за gap_timeout, — откаченная транзакция
+        for missing_id, seen_at in list(self._gaps.items()):
+            if now - seen_at > self.gap_timeout:
+                del self._gaps[missing_id]
+        return sorted(filled + list(changes), key=lambda change: change.id)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Ошибка опроса журнала изменений: {e}")
+
+
+# Общая лента для всех экранов приложения
+change_feed = ChangeFeed()
+
+
+def changed_ids(changes: list, *actions: str) -> list:
+    """Id записей с действиями actions (без повторов, по порядку)"""
+    return list(dict.fromkeys(
+        change.entity_id for change in changes if change.action in actions and change.entity_id is not None
+    ))
@@ -3,10 +3,16 @@
 """
 import flet as ft
 from app.database import SessionLocal
-from app.services.order_service import get_orders, get_order, create_order, update_order, delete_order
-from app.services.product_service import get_products, get_pickup_points, get_product_by_article
+from app.services.order_service import (
+    get_orders, get_order, get_orders_by_ids, create_order, update_order, delete_order,
+    build_order_items, build_order_update_items, format_order_lines, get_order_lines, parse_order_lines
+)
+from app.services.product_service import get_products, get_pickup_points
+from app.services.change_service import ORDER, CREATE, UPDATE, DELETE, RELOAD
 from app.schemas import OrderCreate, OrderUpdate
 from desktop.notifications import show_error, show_warning, show_info
+from desktop.card_cache import CardCache
+from desktop.change_feed import change_feed, changed_ids
 from datetime import datetime
 
 
@@ -32,14 +38,110 @@ def create_orders_view(page: ft.Page, app_state):
         expand=True
     )
     
+    def build_order_card(order_data) -> ft.Container:
+        """Карточка заказа"""
+        # Информация о заказе (левая часть)
+        info_column = ft.Column(
+            [
+                ft.Text(
+                    f"Артикул заказа: {order_data.article}",
+                    size=12,
+                    weight=ft.FontWeight.BOLD,
+                    color="#000000",
+                    font_family="Times New Roman"
+                ),
+                ft.Text(
+                    f"Статус заказа: {order_data.status}",
+                    size=11,
+                    color="#000000",
+                    font_family="Times New Roman"
+                ),
+                ft.Text(
+                    f"Адрес пункта выдачи: {order_data.pickup_address}",
+                    size=11,
+                    color="#000000",
+                    font_family="Times New Roman",
+                    max_lines=2
+                ),
+                ft.Text(
+                    f"Дата заказа: {order_data.order_date.strftime('%Y-%m-%d') if order_data.order_date else 'Не указана'}",
+                    size=11,
+                    color="#000000",
+                    font_family="Times New Roman"
+                ),
+            ],
+            spacing=3,
+            expand=True
+        )
+        
+        # Блок даты доставки справа (зеленый фон)
+        delivery_block = ft.Container(
+            content=ft.Column(
+                [
+                    ft.Text(
+                        "Дата доставки:",
+                        size=12,
+                        weight=ft.FontWeight.BOLD,
+                        color="#000000",
+                        font_family="Times New Roman",
+                        text_align=ft.TextAlign.CENTER
+                    ),
+                    ft.Text(
+                        order_data.delivery_date.strftime('%Y-%m-%d') if order_data.delivery_date else "Не указана",
+                        size=14,
+                        weight=ft.FontWeight.BOLD,
+                        color="#000000",
+                        font_family="Times New Roman",
+                        text_align=ft.TextAlign.CENTER
+                    )
+                ],
+                horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+                alignment=ft.MainAxisAlignment.CENTER,
+                spacing=10
+            ),
+            width=120,
+            height=80,
+            bgcolor="#00FF00",
+            border=ft.border.all(2, "#000000"),
+            alignment=ft.alignment.center,
+            padding=5
+        )
+        
+        # Карточка заказа
+        order_card = ft.Container(
+            content=ft.Row(
+                [
+                    ft.Container(
+                        content=info_column,
+                        expand=True,
+                        padding=10,
+                        border=ft.border.only(right=ft.BorderSide(2, "#000000"))
+                    ),
+                    delivery_block
+                ],
+                spacing=0,
+                alignment=ft.MainAxisAlignment.START
+            ),
+            bgcolor="#FFFFFF",
+            border=ft.border.all(2, "#000000"),
+            padding=0,
+            on_click=lambda e, order_id=order_data.id: edit_order(order_id) if role == "admin" else None
+        )
+        
+        return order_card
+    
+    # Карточки по id заказа: при обновлении списка перестраиваются только изменённые
+    order_cards = CardCache(build_order_card)
+    
     def refresh_orders():
         """Обновление списка заказов"""
         refresh_db = SessionLocal()
         try:
             orders_list = get_orders(refresh_db)
-            orders_container.controls.clear()
             
             if not orders_list:
+                order_cards.clear()
+                orders_container.controls.clear()
                 orders_container.controls.append(
                     ft.Container(
                         content=ft.Text(
@@ -55,107 +157,14 @@ def create_orders_view(page: ft.Page, app_state):
                 page.update()
                 return
             
-            for order in orders_list:
-                def create_order_card(order_data):
-                    # Информация о заказе (левая часть)
-                    info_column = ft.Column(
-                        [
-                            ft.Text(
-                                f"Артикул заказа: {order_data.article}",
-                                size=12,
-                                weight=ft.FontWeight.BOLD,
-                                color="#000000",
-                                font_family="Times New Roman"
-                            ),
-                            ft.Text(
-                                f"Статус заказа: {order_data.status}",
-                                size=11,
-                                color="#000000",
-                                font_family="Times New Roman"
-                            ),
-                            ft.Text(
-                                f"Адрес пункта выдачи: {order_data.pickup_address}",
-                                size=11,
-                                color="#000000",
-                                font_family="Times New Roman",
-                                max_lines=2
-                            ),
-                            ft.Text(
-                                f"Дата заказа: {order_data.order_date.strftime('%Y-%m-%d') if order_data.order_date else 'Не указана'}",
-                                size=11,
-                                color="#000000",
-                                font_family="Times New Roman"
-                            ),
-                        ],
-                        spacing=3,
-                        expand=True
-                    )
-                    
-                    # Блок даты доставки справа (зеленый фон)
-                    delivery_block = ft.Container(
-                        content=ft.Column(
-                            [
-                                ft.Text(
-                                    "Дата доставки:",
-                                    size=12,
-                                    weight=ft.FontWeight.BOLD,
-                                    color="#000000",
-                                    font_family="Times New Roman",
-                                    text_align=ft.TextAlign.CENTER
-                                ),
-                                ft.Text(
-                                    order_data.delivery_date.strftime('%Y-%m-%d') if order_data.delivery_date else "Не указана",
-                                    size=14,
-                                    weight=ft.FontWeight.BOLD,
-                                    color="#000000",
-                                    font_family="Times New Roman",
-                                    text_align=ft.TextAlign.CENTER
-                                )
-                            ],
-                            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-                            alignment=ft.MainAxisAlignment.CENTER,
-                            spacing=10
-                        ),
-                        width=120,
-                        height=80,
-                        bgcolor="#00FF00",
-                        border=ft.border.all(2, "#000000"),
-                        alignment=ft.alignment.center,
-                        padding=5
-                    )
-                    
-                    # Карточка заказа
-                    order_card = ft.Container(
-                        content=ft.Row(
-                            [
-                                ft.Container(
-                                    content=info_column,
-                                    expand=True,
-                                    padding=10,
-                                    border=ft.border.only(right=ft.BorderSide(2, "#000000"))
-                                ),
-                                delivery_block
-                            ],
-                            spacing=0,
-                            alignment=ft.MainAxisAlignment.START
-                        ),
-                        bgcolor="#FFFFFF",
-                        border=ft.border.all(2, "#000000"),
-                        padding=0,
-                        on_click=lambda e, order_id=order_data.id: edit_order(order_id) if role == "admin" else None
-                    )
-                    
-                    return order_card
-                
-                card = create_order_card(order)
-                orders_container.controls.append(card)
-            
+            order_cards.sync(orders_container, orders_list)
             page.update()
         except Exception as e:
             print(f"Ошибка при обновлении заказов: {e}")
             import traceback
             traceback.print_exc()
             
+            order_cards.clear()
             orders_container.controls.clear()
             orders_container.controls.append(
                 ft.Container(
@@ -190,22 +199,16 @@ def create_orders_view(page: ft.Page, app_state):
         form_db = SessionLocal()
         try:
             order = get_order(form_db, order_id) if order_id else None
-            products_list = get_products(form_db)
+            products_list = get_products(form_db, eager=None)
             pickup_points_list = get_pickup_points(form_db)
             
             # Список выбранных товаров: [{'article': 'XXX', 'quantity': N}, ...]
             selected_items = []
             
-            # Парсинг существующих товаров из заказа (формат: "ART1, QTY1, ART2, QTY2")
-            if order and order.article:
-                parts = [p.strip() for p in order.article.split(',')]
-                for i in range(0, len(parts) - 1, 2):
-                    try:
-                        article = parts[i]
-                        qty = int(parts[i + 1])
-                        selected_items.append({'article': article, 'quantity': qty})
-                    except (ValueError, IndexError):
-                        pass
+            # Позиции заказа; у заказов без позиций — разбор строки "ART1, QTY1, ART2, QTY2"
+            if order:
+                lines = get_order_lines(form_db, order.id) or parse_order_lines(order.article)
+                selected_items = [{'article': article, 'quantity': qty} for article, qty in lines]
             
             # Контейнер для отображения выбранных товаров (со скроллом)
             items_list_container = ft.Column(
@@ -417,18 +420,17 @@ def create_orders_view(page: ft.Page, app_state):
                     if not order_date_field.value:
                         raise ValueError("Дата заказа обязательна")
                     
-                    # Проверка существования всех товаров
-                    for item in selected_items:
-                        product = get_product_by_article(save_db, item['article'])
-                        if not product:
-                            raise ValueError(f"Товар с артикулом {item['article']} не найден")
-                    
-                    # Формирование строки артикулов: "ART1, QTY1, ART2, QTY2"
-                    article_parts = []
-                    for item in selected_items:
-                        article_parts.append(item['article'])
-                        article_parts.append(str(item['quantity']))
-                    article_string = ', '.join(article_parts)
+                    # Позиции заказа (проверка существования всех товаров одним запросом);
+                    # у изменяемого заказа — только если состав изменился
+                    lines = [(item['article'], item['quantity']) for item in selected_items]
+                    if order_id:
+                        saved_order = get_order(save_db, order_id)
+                        if not saved_order:
+                            raise Exception("Заказ не найден")
+                        items = build_order_update_items(save_db, saved_order, lines)
+                    else:
+                        items = build_order_items(save_db, lines)
+                    article_string = format_order_lines(lines)
                     
                     # Парсинг дат
                     order_date = datetime.strptime(order_date_field.value, "%Y-%m-%d")
@@ -443,7 +445,8 @@ def create_orders_view(page: ft.Page, app_state):
                             status=status_dropdown.value,
                             pickup_address=pickup_dropdown.value,
                             order_date=order_date,
-                            delivery_date=delivery_date
+                            delivery_date=delivery_date,
+                            items=items
                         )
                         result = update_order(save_db, order_id, order_data)
                         if not result:
@@ -455,7 +458,7 @@ def create_orders_view(page: ft.Page, app_state):
                             pickup_address=pickup_dropdown.value,
                             order_date=order_date,
                             delivery_date=delivery_date,
-                            items=[]
+                            items=items
                         )
                         result = create_order(save_db, order_data)
                         if not result:
@@ -469,7 +472,9 @@ def create_orders_view(page: ft.Page, app_state):
                         if isinstance(overlay_item, (ft.AlertDialog, ft.Container, ft.Stack)):
                             page.overlay.remove(overlay_item)
                     
-                    refresh_orders()
+                    # Изменённый заказ перестраивается на месте, новый — обновлением списка
+                    if not order_id or order_cards.patch(result) is None:
+                        refresh_orders()
                     page.update()
                     show_info(page, "Заказ успешно сохранен")
                 except ValueError as ex:
@@ -620,7 +625,7 @@ def create_orders_view(page: ft.Page, app_state):
         def confirm_delete(e):
             try:
                 if delete_order(db, order_id):
-                    refresh_orders()
+                    order_cards.remove(orders_container, order_id)
                     confirm_dialog.open = False
                     if confirm_dialog in page.overlay:
                         page.overlay.remove(confirm_dialog)
@@ -677,8 +682,26 @@ def create_orders_view(page: ft.Page, app_state):
         confirm_dialog.open = True
         page.update()
     
+    def on_order_changes(changes: list):
+        """Изменения заказов из журнала: перестраиваются только затронутые карточки"""
+        if any(change.action in (CREATE, RELOAD) for change in changes):
+            refresh_orders()
+            return
+        for order_id in changed_ids(changes, DELETE):
+            order_cards.remove(orders_container, order_id)
+        updated_ids = [order_id for order_id in changed_ids(changes, UPDATE) if order_id in order_cards]
+        if updated_ids:
+            feed_db = SessionLocal()
+            try:
+                for order in get_orders_by_ids(feed_db, updated_ids):
+                    order_cards.patch(order)
+            finally:
+                feed_db.close()
+        page.update()
+    
     def on_logout(e):
         """Выход из системы"""
+        change_feed.unsubscribe(on_order_changes)
         from desktop.auth_view import create_login_view
         app_state.logout()
         page.views.clear()
@@ -687,6 +710,7 @@ def create_orders_view(page: ft.Page, app_state):
     
     def on_back(e):
         """Обработчик кнопки Назад"""
+        change_feed.unsubscribe(on_order_changes)
         from desktop.products_view import create_products_view
         page.views.clear()
         page.views.append(create_products_view(page, app_state))
@@ -694,12 +718,14 @@ def create_orders_view(page: ft.Page, app_state):
     
     def navigate_to_products(e):
         """Переход к товарам"""
+        change_feed.unsubscribe(on_order_changes)
         from desktop.products_view import create_products_view
         page.views.clear()
         page.views.append(create_products_view(page, app_state))
         page.update()
     
-    # Инициализация
+    # Инициализация (подписка на изменения — до загрузки списка)
+    change_feed.subscribe(ORDER, on_order_changes)
     refresh_orders()
     
     # Кастомный заголовок
@@ -6,15 +6,22 @@ from app.database import SessionLocal
 from app.services.product_service import (
     get_products, get_product, create_product, update_product,
     delete_product, get_categories, get_manufacturers, get_suppliers,
-    get_product_by_article
+    get_product_by_article, get_products_page, get_products_by_ids
 )
+from app.services.change_service import PRODUCT, CREATE, UPDATE, DELETE, RELOAD
 from app.schemas import ProductCreate, ProductUpdate
 from desktop.notifications import show_error, show_warning, show_info
+from desktop.query_scheduler import QueryScheduler
+from desktop.card_cache import CardCache
+from desktop.change_feed import change_feed, changed_ids
 import os
 from PIL import Image
 import uuid
 
 
+# Товаров на странице списка (следующая загружается при прокрутке)
+PRODUCTS_PAGE_SIZE = int(os.getenv("DESKTOP_PAGE_SIZE", "30"))
+
 # Глобальная переменная для отслеживания открытых форм редактирования
 _open_form_dialog = None
 
@@ -25,13 +32,11 @@ def create_products_view(page: ft.Page, app_state):
     db = SessionLocal()
     role = app_state.current_user.role if app_state.current_user else "guest"
     
-    # Получение данных с обработкой ошибок
+    # Справочник поставщиков для фильтра; товары загружаются постранично (load_products)
     try:
-        products = get_products(db)
         suppliers = get_suppliers(db) if role in ["manager", "admin"] else []
     except Exception as e:
         print(f"Ошибка при загрузке данных: {e}")
-        products = []
         suppliers = []
     
     # Элементы управления фильтров
@@ -40,7 +45,7 @@ def create_products_view(page: ft.Page, app_state):
         width=200,
         text_size=12,
         visible=role in ["manager", "admin"],
-        on_change=lambda e: refresh_products(),
+        on_change=lambda e: on_search_change(e),
         bgcolor="#FFFFFF",
         border_color="#000000"
     )
@@ -74,39 +79,255 @@ def create_products_view(page: ft.Page, app_state):
         border_color="#000000"
     )
     
-    # Контейнер для карточек товаров
-    products_container = ft.Column(
+    # Список карточек товаров: карточки строятся клиентом Flet по мере
+    # прокрутки, следующая страница загружается у конца списка
+    products_container = ft.ListView(
         controls=[],
-        scroll=ft.ScrollMode.AUTO,
         spacing=10,
-        expand=True
+        expand=True,
+        build_controls_on_demand=True,
+        on_scroll=lambda e: on_products_scroll(e),
+        on_scroll_interval=100
     )
     
-    def refresh_products():
-        """Обновление списка товаров"""
-        refresh_db = SessionLocal()
+    # Загруженная часть списка: условия, курсор следующей страницы, идёт ли загрузка
+    listing = {"filters": None, "next": None, "loading": False}
+    
+    def read_filters() -> dict:
+        """Условия поиска из элементов управления (в потоке интерфейса)"""
+        search = search_field.value if search_field.visible and search_field.value else None
+        supplier_id = None
+        if supplier_dropdown.visible and supplier_dropdown.value:
+            value = supplier_dropdown.value.strip()
+            if value and value != "" and value != "Все поставщики":
+                try:
+                    supplier_id = int(value)
+                except (ValueError, AttributeError):
+                    supplier_id = None
+        sort_by_stock = sort_dropdown.value if sort_dropdown.visible and sort_dropdown.value else None
+        return {"search": search, "supplier_id": supplier_id, "sort_by_stock": sort_by_stock}
+    
+    def load_products(request: tuple) -> tuple:
+        """Запрос страницы товаров в отдельной сессии (выполняется в фоновом потоке)
+
+        request — (условия, курсор); курсор None — первая страница. Результаты
+        поиска по релевантности листаются по смещению, остальные — по ключу.
+        Возвращает (request, товары, курсор следующей страницы).
+        """
+        filters, cursor = request
+        load_db = SessionLocal()
         try:
-            search = search_field.value if search_field.visible and search_field.value else None
-            supplier_id = None
-            if supplier_dropdown.visible and supplier_dropdown.value:
-                value = supplier_dropdown.value.strip()
-                if value and value != "" and value != "Все поставщики":
-                    try:
-                        supplier_id = int(value)
-                    except (ValueError, AttributeError):
-                        supplier_id = None
-            sort_by_stock = sort_dropdown.value if sort_dropdown.visible and sort_dropdown.value else None
-            
-            products_list = get_products(
-                refresh_db,
-                search=search,
-                supplier_id=supplier_id,
-                sort_by_stock=sort_by_stock
+            if filters["search"] and not filters["sort_by_stock"]:
+                offset = cursor or 0
+                products_list = get_products(
+                    load_db, skip=offset, limit=PRODUCTS_PAGE_SIZE + 1, ranked=True, **filters
+                )
+                next_cursor = offset + PRODUCTS_PAGE_SIZE if len(products_list) > PRODUCTS_PAGE_SIZE else None
+                return request, products_list[:PRODUCTS_PAGE_SIZE], next_cursor
+            products_page = get_products_page(load_db, cursor=cursor, limit=PRODUCTS_PAGE_SIZE, **filters)
+            return request, products_page.items, products_page.next_cursor
+        finally:
+            load_db.close()
+    
+    def show_load_error(e: Exception):
+        """Сообщение об ошибке загрузки вместо карточек"""
+        print(f"Ошибка при обновлении товаров: {e}")
+        import traceback
+        traceback.print_exception(e)
+        listing["loading"] = False
+        
+        product_cards.clear()
+        products_container.controls.clear()
+        products_container.controls.append(
+            ft.Container(
+                content=ft.Text(
+                    f"Ошибка загрузки данных: {str(e)}",
+                    size=14,
+                    color="#FF0000",
+                    font_family="Times New Roman"
+                ),
+                padding=20
             )
-            
-            products_container.controls.clear()
-            
-            if not products_list:
+        )
+        page.update()
+    
+    def build_product_card(product) -> ft.Container:
+        """Карточка товара"""
+        category_name = product.category.name if product.category else "Не указана"
+        manufacturer_name = product.manufacturer.name if product.manufacturer else "Не указан"
+        supplier_name = product.supplier.name if product.supplier else "Не указан"
+        
+        # Изображение товара
+        if product.image_path:
+            image_path = f"app/{product.image_path}"
+        else:
+            image_path = "app/static/images/picture.png"
+        
+        image_widget = ft.Container(
+            width=120,
+            height=120,
+            content=ft.Image(
+                src=image_path,
+                fit=ft.ImageFit.CONTAIN,
+                error_content=ft.Image(src="app/static/images/picture.png", fit=ft.ImageFit.CONTAIN)
+            ),
+            alignment=ft.alignment.center,
+            border=ft.border.all(1, "#000000")
+        )
+        
+        # Цена с учетом скидки
+        final_price = product.price * (1 - product.discount_percent / 100)
+        price_row = ft.Row(controls=[], spacing=5)
+        
+        if product.discount_percent > 0:
+            price_row.controls.append(
+                ft.Text(
+                    f"Цена: {product.price:.0f}",
+                    size=12,
+                    color="#FF0000",
+                    style=ft.TextStyle(decoration=ft.TextDecoration.LINE_THROUGH),
+                    font_family="Times New Roman"
+                )
+            )
+            price_row.controls.append(
+                ft.Text(
+                    f"{final_price:.0f} руб.",
+                    size=14,
+                    weight=ft.FontWeight.BOLD,
+                    color="#000000",
+                    font_family="Times New Roman"
+                )
+            )
+        else:
+            price_row.controls.append(
+                ft.Text(
+                    f"Цена: {product.price:.0f} руб.",
+                    size=14,
+                    weight=ft.FontWeight.BOLD,
+                    color="#000000",
+                    font_family="Times New Roman"
+                )
+            )
+        
+        # Информация о товаре (центральная часть)
+        info_column = ft.Column(
+            [
+                ft.Text(
+                    f"{category_name} | {product.name}",
+                    size=14,
+                    weight=ft.FontWeight.BOLD,
+                    color="#000000",
+                    font_family="Times New Roman"
+                ),
+                ft.Text(
+                    f"Описание: {product.description or 'Нет описания'}",
+                    size=11,
+                    color="#000000",
+                    font_family="Times New Roman",
+                    max_lines=2
+                ),
+                ft.Text(
+                    f"Производитель: {manufacturer_name}",
+                    size=11,
+                    color="#000000",
+                    font_family="Times New Roman"
+                ),
+                ft.Text(
+                    f"Поставщик: {supplier_name}",
+                    size=11,
+                    color="#000000",
+                    font_family="Times New Roman"
+                ),
+                price_row,
+                ft.Text(
+                    f"Единица измерения: {product.unit}",
+                    size=11,
+                    color="#000000",
+                    font_family="Times New Roman"
+                ),
+                ft.Text(
+                    f"Количество на складе: {product.stock_quantity}",
+                    size=11,
+                    color="#000000",
+                    font_family="Times New Roman"
+                ),
+            ],
+            spacing=2,
+            expand=True
+        )
+        
+        # Блок скидки справа (цвет зависит от процента)
+        discount_bg_color = "#2E8B57" if product.discount_percent > 15 else "#00FF00"
+        
+        discount_block = ft.Container(
+            content=ft.Column(
+                [
+                    ft.Text(
+                        "Действующая скидка",
+                        size=12,
+                        weight=ft.FontWeight.BOLD,
+                        color="#000000",
+                        font_family="Times New Roman",
+                        text_align=ft.TextAlign.CENTER
+                    ),
+                    ft.Text(
+                        f"{product.discount_percent:.0f}%",
+                        size=24,
+                        weight=ft.FontWeight.BOLD,
+                        color="#000000",
+                        font_family="Times New Roman",
+                        text_align=ft.TextAlign.CENTER
+                    )
+                ],
+                horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+                alignment=ft.MainAxisAlignment.CENTER,
+                spacing=5
+            ),
+            width=100,
+            height=120,
+            bgcolor=discount_bg_color,
+            border=ft.border.all(2, "#000000"),
+            alignment=ft.alignment.center
+        )
+        
+        # Цвет фона: синий если остаток 0
+        card_bgcolor = "#90CAF9" if product.stock_quantity == 0 else "#FFFFFF"
+        
+        # Карточка товара
+        product_card = ft.Container(
+            content=ft.Row(
+                [
+                    image_widget,
+                    ft.Container(
+                        content=info_column,
+                        expand=True,
+                        padding=10
+                    ),
+                    discount_block
+                ],
+                spacing=0,
+                alignment=ft.MainAxisAlignment.START
+            ),
+            bgcolor=card_bgcolor,
+            border=ft.border.all(2, "#000000"),
+            padding=5,
+            on_click=lambda e, p_id=product.id: edit_product(p_id) if role == "admin" else None,
+            data=product.id
+        )
+        
+        return product_card
+    
+    # Карточки по id товара: при обновлении списка перестраиваются только изменённые
+    product_cards = CardCache(build_product_card)
+    
+    def show_products(result: tuple):
+        """Карточки загруженной страницы: первая заменяет список, следующие добавляются"""
+        request, products_list, next_cursor = result
+        filters, cursor = request
+        try:
+            if cursor is None and not products_list:
+                product_cards.clear()
+                products_container.controls.clear()
                 products_container.controls.append(
                     ft.Container(
                         content=ft.Text(
@@ -119,199 +340,65 @@ def create_products_view(page: ft.Page, app_state):
                         alignment=ft.alignment.center
                     )
                 )
-                page.update()
-                return
-            
-            for product in products_list:
-                try:
-                    category_name = product.category.name if product.category else "Не указана"
-                    manufacturer_name = product.manufacturer.name if product.manufacturer else "Не указан"
-                    supplier_name = product.supplier.name if product.supplier else "Не указан"
-                    
-                    # Изображение товара
-                    if product.image_path:
-                        image_path = f"app/{product.image_path}"
-                    else:
-                        image_path = "app/static/images/picture.png"
-                    
-                    image_widget = ft.Container(
-                        width=120,
-                        height=120,
-                        content=ft.Image(
-                            src=image_path,
-                            fit=ft.ImageFit.CONTAIN,
-                            error_content=ft.Image(src="app/static/images/picture.png", fit=ft.ImageFit.CONTAIN)
-                        ),
-                        alignment=ft.alignment.center,
-                        border=ft.border.all(1, "#000000")
-                    )
-                    
-                    # Цена с учетом скидки
-                    final_price = product.price * (1 - product.discount_percent / 100)
-                    price_row = ft.Row(controls=[], spacing=5)
-                    
-                    if product.discount_percent > 0:
-                        price_row.controls.append(
-                            ft.Text(
-                                f"Цена: {product.price:.0f}",
-                                size=12,
-                                color="#FF0000",
-                                style=ft.TextStyle(decoration=ft.TextDecoration.LINE_THROUGH),
-                                font_family="Times New Roman"
-                            )
-                        )
-                        price_row.controls.append(
-                            ft.Text(
-                                f"{final_price:.0f} руб.",
-                                size=14,
-                                weight=ft.FontWeight.BOLD,
-                                color="#000000",
-                                font_family="Times New Roman"
-                            )
-                        )
-                    else:
-                        price_row.controls.append(
-                            ft.Text(
-                                f"Цена: {product.price:.0f} руб.",
-                                size=14,
-                                weight=ft.FontWeight.BOLD,
-                                color="#000000",
-                                font_family="Times New Roman"
-                            )
-                        )
-                    
-                    # Информация о товаре (центральная часть)
-                    info_column = ft.Column(
-                        [
-                            ft.Text(
-                                f"{category_name} | {product.name}",
-                                size=14,
-                                weight=ft.FontWeight.BOLD,
-                                color="#000000",
-                                font_family="Times New Roman"
-                            ),
-                            ft.Text(
-                                f"Описание: {product.description or 'Нет описания'}",
-                                size=11,
-                                color="#000000",
-                                font_family="Times New Roman",
-                                max_lines=2
-                            ),
-                            ft.Text(
-                                f"Производитель: {manufacturer_name}",
-                                size=11,
-                                color="#000000",
-                                font_family="Times New Roman"
-                            ),
-                            ft.Text(
-                                f"Поставщик: {supplier_name}",
-                                size=11,
-                                color="#000000",
-                                font_family="Times New Roman"
-                            ),
-                            price_row,
-                            ft.Text(
-                                f"Единица измерения: {product.unit}",
-                                size=11,
-                                color="#000000",
-                                font_family="Times New Roman"
-                            ),
-                            ft.Text(
-                                f"Количество на складе: {product.stock_quantity}",
-                                size=11,
-                                color="#000000",
-                                font_family="Times New Roman"
-                            ),
-                        ],
-                        spacing=2,
-                        expand=True
-                    )
-                    
-                    # Блок скидки справа (цвет зависит от процента)
-                    discount_bg_color = "#2E8B57" if product.discount_percent > 15 else "#00FF00"
-                    
-                    discount_block = ft.Container(
-                        content=ft.Column(
-                            [
-                                ft.Text(
-                                    "Действующая скидка",
-                                    size=12,
-                                    weight=ft.FontWeight.BOLD,
-                                    color="#000000",
-                                    font_family="Times New Roman",
-                                    text_align=ft.TextAlign.CENTER
-                                ),
-                                ft.Text(
-                                    f"{product.discount_percent:.0f}%",
-                                    size=24,
-                                    weight=ft.FontWeight.BOLD,
-                                    color="#000000",
-                                    font_family="Times New Roman",
-                                    text_align=ft.TextAlign.CENTER
-                                )
-                            ],
-                            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-                            alignment=ft.MainAxisAlignment.CENTER,
-                            spacing=5
-                        ),
-                        width=100,
-                        height=120,
-                        bgcolor=discount_bg_color,
-                        border=ft.border.all(2, "#000000"),
-                        alignment=ft.alignment.center
-                    )
-                    
-                    # Цвет фона: синий если остаток 0
-                    card_bgcolor = "#90CAF9" if product.stock_quantity == 0 else "#FFFFFF"
-                    
-                    # Карточка товара
-                    product_card = ft.Container(
-                        content=ft.Row(
-                            [
-                                image_widget,
-                                ft.Container(
-                                    content=info_column,
-                                    expand=True,
-                                    padding=10
-                                ),
-                                discount_block
-                            ],
-                            spacing=0,
-                            alignment=ft.MainAxisAlignment.START
-                        ),
-                        bgcolor=card_bgcolor,
-                        border=ft.border.all(2, "#000000"),
-                        padding=5,
-                        on_click=lambda e, p_id=product.id: edit_product(p_id) if role == "admin" else None,
-                        data=product.id
-                    )
-                    
-                    products_container.controls.append(product_card)
-                except Exception as e:
-                    print(f"Ошибка при обработке товара {product.id}: {e}")
-                    continue
+            else:
+                product_cards.sync(products_container, products_list, append=cursor is not None)
         except Exception as e:
-            print(f"Ошибка при обновлении товаров: {e}")
-            import traceback
-            traceback.print_exc()
-            
-            products_container.controls.clear()
-            products_container.controls.append(
-                ft.Container(
-                    content=ft.Text(
-                        f"Ошибка загрузки данных: {str(e)}",
-                        size=14,
-                        color="#FF0000",
-                        font_family="Times New Roman"
-                    ),
-                    padding=20
-                )
-            )
+            show_load_error(e)
+            return
         finally:
-            refresh_db.close()
+            listing["filters"] = filters
+            listing["next"] = next_cursor
+            listing["loading"] = False
         
         page.update()
     
+    # Запрос товаров выполняется в фоновом потоке: ввод в поле поиска не ждёт
+    # базу данных, нажатия клавиш объединяются в один запрос после паузы
+    product_query = QueryScheduler(load_products, show_products, show_load_error, name="products-query")
+    
+    def refresh_products():
+        """Обновление списка товаров (сразу, без паузы)"""
+        listing["loading"] = True
+        product_query.run_now((read_filters(), None))
+    
+    def on_search_change(e):
+        """Поиск после паузы во вводе"""
+        listing["loading"] = True
+        product_query.schedule((read_filters(), None))
+    
+    def on_product_changes(changes: list):
+        """Изменения товаров из журнала: перестраиваются только показанные карточки"""
+        # Новый товар может оказаться на любой позиции списка — список перечитывается,
+        # карточки неизменившихся товаров переиспользуются
+        if any(change.action in (CREATE, RELOAD) for change in changes):
+            refresh_products()
+            return
+        for product_id in changed_ids(changes, DELETE):
+            product_cards.remove(products_container, product_id)
+        updated_ids = [product_id for product_id in changed_ids(changes, UPDATE) if product_id in product_cards]
+        if updated_ids:
+            feed_db = SessionLocal()
+            try:
+                for product in get_products_by_ids(feed_db, updated_ids):
+                    product_cards.patch(product)
+            finally:
+                feed_db.close()
+        page.update()
+    
+    def leave_screen():
+        """Остановка фоновой загрузки и отписка от изменений при уходе с экрана"""
+        product_query.close()
+        change_feed.unsubscribe(on_product_changes)
+    
+    def on_products_scroll(e: ft.OnScrollEvent):
+        """Загрузка следующей страницы, когда до конца списка меньше экрана"""
+        if listing["loading"] or listing["next"] is None:
+            return
+        if e.pixels < e.max_scroll_extent - e.viewport_dimension:
+            return
+        listing["loading"] = True
+        product_query.run_now((listing["filters"], listing["next"]))
+    
     def add_product(e):
         """Открытие формы добавления товара"""
         try:
@@ -593,8 +680,9 @@ def create_products_view(page: ft.Page, app_state):
                     
                     if product_id:
                         update_data = ProductUpdate(**product_data.dict())
-                        update_product(save_db, product_id, update_data, image_path=saved_image_path)
+                        saved_product = update_product(save_db, product_id, update_data, image_path=saved_image_path)
                     else:
+                        saved_product = None
                         create_product(save_db, product_data, image_path=saved_image_path)
                     
                     global _open_form_dialog
@@ -602,7 +690,9 @@ def create_products_view(page: ft.Page, app_state):
                     for overlay_item in list(page.overlay):
                         if isinstance(overlay_item, (ft.AlertDialog, ft.Container, ft.Stack)):
                             page.overlay.remove(overlay_item)
-                    refresh_products()
+                    # Изменённый товар перестраивается на месте, новый — обновлением списка
+                    if saved_product is None or product_cards.patch(saved_product) is None:
+                        refresh_products()
                     page.update()
                 except ValueError as ex:
                     show_error(page, f"Ошибка валидации: {str(ex)}")
@@ -764,7 +854,7 @@ def create_products_view(page: ft.Page, app_state):
         def confirm_delete(e):
             try:
                 if delete_product(db, product_id):
-                    refresh_products()
+                    product_cards.remove(products_container, product_id)
                     confirm_dialog.open = False
                     if confirm_dialog in page.overlay:
                         page.overlay.remove(confirm_dialog)
@@ -823,6 +913,7 @@ def create_products_view(page: ft.Page, app_state):
     
     def on_back(e):
         """Обработчик кнопки Назад"""
+        leave_screen()
         from desktop.auth_view import create_login_view
         page.views.clear()
         page.views.append(create_login_view(page, app_state))
@@ -830,6 +921,7 @@ def create_products_view(page: ft.Page, app_state):
     
     def on_logout(e):
         """Выход из системы"""
+        leave_screen()
         from desktop.auth_view import create_login_view
         app_state.logout()
         page.views.clear()
@@ -842,18 +934,21 @@ def create_products_view(page: ft.Page, app_state):
             show_error(page, "Доступ запрещен")
             return
         
+        leave_screen()
         from desktop.orders_view import create_orders_view
         page.views.clear()
         page.views.append(create_orders_view(page, app_state))
         page.update()
     
-    # Инициализация таблицы
+    # Инициализация таблицы: первая загрузка — до показа экрана. Подписка —
+    # до загрузки, чтобы не пропустить изменения, сделанные во время неё
+    change_feed.subscribe(PRODUCT, on_product_changes)
     try:
-        refresh_products()
+        first_page = load_products((read_filters(), None))
     except Exception as e:
-        print(f"Ошибка при инициализации таблицы: {e}")
-        import traceback
-        traceback.print_exc()
+        show_load_error(e)
+    else:
+        show_products(first_page)
     
     # Кастомный заголовок
     header = ft.Container(
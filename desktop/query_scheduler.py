@@ -0,0 +1,113 @@
+"""
+Фоновое выполнение запросов экранов десктопного приложения
+
+Запросы выполняются в отдельном потоке, а не в обработчике события Flet:
+окно не подвисает, пока идёт запрос к базе. Частые запросы (ввод в поле
+поиска) объединяются: выполняется только последний после паузы во вводе,
+а результат запроса, устаревшего к моменту завершения, отбрасывается.
+"""
+import os
+import threading
+import time
+
+# Пауза во вводе (с), после которой выполняется поиск
+SEARCH_DEBOUNCE = float(os.getenv("SEARCH_DEBOUNCE", "0.3"))
+
+
+class QueryScheduler:
+    """Планировщик запросов экрана с одним фоновым потоком
+
+    query(params) выполняется в фоновом потоке, on_result(result) и
+    on_error(exception) вызываются там же и только для актуального запроса.
+    Одновременно выполняется не больше одного запроса.
+    """
+
+    def __init__(self, query, on_result, on_error=None, delay: float = SEARCH_DEBOUNCE, name: str = "query"):
+        self.query = query
+        self.on_result = on_result
+        self.on_error = on_error
+        self.delay = delay
+        self.name = name
+        self._condition = threading.Condition()
+        self._generation = 0
+        self._params = None
+        self._pending = False
+        self._due = 0.0
+        self._closed = False
+        self._thread = None
+
+    def schedule(self, params=None, delay: float = None):
+        """Запрос с параметрами params через delay секунд (по умолчанию — пауза поиска)
+
+        Новый запрос заменяет ожидающий и делает устаревшим выполняющийся.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._generation += 1
+            self._params = params
+            self._pending = True
+            self._due = time.monotonic() + (self.delay if delay is None else delay)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+                self._thread.start()
+            self._condition.notify()
+
+    def run_now(self, params=None):
+        """Запрос без паузы (смена фильтра, обновление после сохранения)"""
+        self.schedule(params, delay=0)
+
+    def cancel(self):
+        """Отмена ожидающего запроса; результат выполняющегося будет отброшен"""
+        with self._condition:
+            self._generation += 1
+            self._pending = False
+            self._condition.notify()
+
+    def close(self):
+        """Остановка фонового потока (при уходе с экрана)"""
+        with self._condition:
+            self._closed = True
+            self._generation += 1
+            self._pending = False
+            self._condition.notify()
+
+    def is_current(self, generation: int) -> bool:
+        """Не заменён ли запрос generation более новым"""
+        with self._condition:
+            return generation == self._generation and not self._closed
+
+    def _next(self):
+        """Ожидание паузы во вводе; (generation, params) или None при остановке"""
+        with self._condition:
+            while True:
+                if self._closed:
+                    return None
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+                remaining = self._due - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                self._pending = False
+                return self._generation, self._params
+
+    def _run(self):
+        while True:
+            task = self._next()
+            if task is None:
+                return
+            generation, params = task
+            try:
+                result = self.query(params)
+            except Exception as e:
+                if self.is_current(generation):
+                    if self.on_error is None:
+                        print(f"Ошибка фонового запроса {self.name}: {e}")
+                    else:
+                        self.on_error(e)
+                continue
+            # Пока шёл запрос, пользователь мог изменить условия поиска
+            if self.is_current(generation):
+                self.on_result(result)
@@ -0,0 +1,31 @@
+"""
+Заполнение позиций заказов (order_items) из строки артикулов Order.article
+
+Заказы, созданные до появления позиций, хранят товары строкой
+"ART1, QTY1, ART2, QTY2". Скрипт создаёт для них записи order_items;
+повторный запуск обрабатывает только заказы без позиций.
+"""
+import sys
+import os
+
+# Добавление корневой директории проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, Base, SessionLocal
+from app.services.order_service import backfill_order_items
+
+# Создание таблиц и индексов, которых ещё нет в базе
+Base.metadata.create_all(bind=engine)
+
+db = SessionLocal()
+
+try:
+    orders_count, items_count = backfill_order_items(db)
+    db.commit()
+    print(f"Заполнено заказов: {orders_count}, позиций: {items_count}")
+except Exception as e:
+    db.rollback()
+    print(f"Ошибка при заполнении позиций заказов: {e}")
+    raise
+finally:
+    db.close()
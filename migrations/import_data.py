@@ -8,11 +8,8 @@ import os
 # Добавление корневой директории проекта в путь
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import csv
-from sqlalchemy.orm import Session
 from app.database import SessionLocal
-from app.models import Category, Manufacturer, Supplier, Product
-from datetime import datetime
+from app.importer import import_products, import_orders
 
 db = SessionLocal()
 
@@ -22,64 +19,12 @@ def import_products_from_csv(filepath: str):
         print(f"Файл {filepath} не найден")
         return
     
-    with open(filepath, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                # Получение или создание категории
-                category = db.query(Category).filter(Category.name == row['category']).first()
-                if not category:
-                    category = Category(name=row['category'])
-                    db.add(category)
-                    db.flush()
-                
-                # Получение или создание производителя
-                manufacturer = db.query(Manufacturer).filter(Manufacturer.name == row['manufacturer']).first()
-                if not manufacturer:
-                    manufacturer = Manufacturer(name=row['manufacturer'])
-                    db.add(manufacturer)
-                    db.flush()
-                
-                # Получение или создание поставщика
-                supplier = db.query(Supplier).filter(Supplier.name == row['supplier']).first()
-                if not supplier:
-                    supplier = Supplier(name=row['supplier'])
-                    db.add(supplier)
-                    db.flush()
-                
-                # Получение артикула или генерация
-                article_val = row.get('article', '').strip()
-                if not article_val:
-                    import uuid
-                    article_val = f"CSV-{uuid.uuid4().hex[:8].upper()}"
-                
-                # Проверка уникальности
-                existing = db.query(Product).filter(Product.article == article_val).first()
-                if existing:
-                    print(f"Товар с артикулом {article_val} уже существует, пропускаем")
-                    continue
-                
-                # Создание товара
-                product = Product(
-                    article=article_val,
-                    name=row['name'],
-                    category_id=category.id,
-                    description=row.get('description', ''),
-                    manufacturer_id=manufacturer.id,
-                    supplier_id=supplier.id,
-                    price=float(row['price']),
-                    unit=row.get('unit', 'шт'),
-                    stock_quantity=int(row.get('stock_quantity', 0)),
-                    discount_percent=float(row.get('discount_percent', 0))
-                )
-                db.add(product)
-                
-            except Exception as e:
-                print(f"Ошибка при импорте строки: {e}")
-                continue
-    
-    db.commit()
-    print(f"Данные из {filepath} успешно импортированы")
+    try:
+        result = import_products(db, filepath)
+        print(result.summary())
+        print(f"Данные из {filepath} успешно импортированы")
+    except Exception as e:
+        print(f"Ошибка при импорте {filepath}: {e}")
 
 
 def import_orders_from_csv(filepath: str):
@@ -88,35 +33,12 @@ def import_orders_from_csv(filepath: str):
         print(f"Файл {filepath} не найден")
         return
     
-    from app.models import Order
-    
-    with open(filepath, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                # Получение или генерация кода
-                code_val = row.get('code', '').strip()
-                if not code_val:
-                    import random
-                    import string
-                    code_val = ''.join(random.choices(string.digits, k=6))
-                
-                order = Order(
-                    article=row['article'],
-                    status=row['status'],
-                    pickup_address=row['pickup_address'],
-                    order_date=datetime.strptime(row['order_date'], '%Y-%m-%d %H:%M:%S'),
-                    delivery_date=datetime.strptime(row['delivery_date'], '%Y-%m-%d %H:%M:%S') if row.get('delivery_date') else None,
-                    code=code_val
-                )
-                db.add(order)
-                
-            except Exception as e:
-                print(f"Ошибка при импорте строки: {e}")
-                continue
-    
-    db.commit()
-    print(f"Данные из {filepath} успешно импортированы")
+    try:
+        result = import_orders(db, filepath)
+        print(result.summary())
+        print(f"Данные из {filepath} успешно импортированы")
+    except Exception as e:
+        print(f"Ошибка при импорте {filepath}: {e}")
 
 
 if __name__ == "__main__":
@@ -133,4 +55,3 @@ if __name__ == "__main__":
         import_orders_from_csv(orders_file)
     
     db.close()
-
@@ -0,0 +1,42 @@
+"""
+Устранение повторяющихся кодов получения заказов
+
+Раньше коды были случайными и могли повторяться, из-за чего уникальный
+индекс ix_orders_code не создаётся. Скрипт оставляет код у самого раннего
+заказа, остальным выдаёт новые коды и создаёт индекс.
+"""
+import sys
+import os
+
+# Добавление корневой директории проекта в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import bindparam, func, select, update
+from app.database import engine, Base, SessionLocal
+from app.models import Order
+from app.services.order_service import allocate_order_codes
+
+Base.metadata.create_all(bind=engine)
+
+db = SessionLocal()
+
+try:
+    first_ids = select(func.min(Order.id)).group_by(Order.code)
+    duplicate_ids = db.scalars(select(Order.id).where(Order.id.not_in(first_ids)).order_by(Order.id)).all()
+    if duplicate_ids:
+        codes = allocate_order_codes(db, len(duplicate_ids))
+        db.execute(
+            update(Order.__table__).where(Order.__table__.c.id == bindparam("b_id")),
+            [{"b_id": order_id, "code": code} for order_id, code in zip(duplicate_ids, codes)]
+        )
+    db.commit()
+    print(f"Новые коды выданы заказам: {len(duplicate_ids)}")
+except Exception as e:
+    db.rollback()
+    print(f"Ошибка при обновлении кодов заказов: {e}")
+    raise
+finally:
+    db.close()
+
+# Повторный create_all создаёт уникальный индекс, пропущенный из-за повторов
+Base.metadata.create_all(bind=engine)
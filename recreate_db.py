@@ -6,11 +6,15 @@ from app.database import Base, engine
 # ВАЖНО: Импортируем все модели, чтобы они были зарегистрированы в Base.metadata
 from app.models import User, Category, Manufacturer, Supplier, Product, Order, OrderItem
 
-# Удаляем старую БД если она есть
-db_file = "shoe_store.db"
-if os.path.exists(db_file):
-    os.remove(db_file)
-    print(f"Удалена старая база данных: {db_file}")
+# Удаляем старую БД если она есть — вместе с файлами журнала WAL (-wal, -shm),
+# иначе SQLite применит старый журнал к новому файлу
+db_file = engine.url.database if engine.dialect.name == "sqlite" else None
+engine.dispose()
+if db_file:
+    for path in (db_file, f"{db_file}-wal", f"{db_file}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+            print(f"Удалена старая база данных: {path}")
 
 # Создаем новую БД со всеми таблицами
 Base.metadata.create_all(bind=engine)
@@ -0,0 +1,84 @@
+"""
+Остаток товара при изменении заказа: резерв держит только оформленный и
+незавершённый заказ
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401 — таблицы в Base.metadata
+from app.database import Base
+from app.models import Category, Manufacturer, Order, Product, Supplier
+from app.schemas import OrderCreate, OrderItemBase, OrderUpdate
+from app.services.order_service import create_order, delete_order, update_order
+
+STOCK = 10
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for model in (Category, Manufacturer, Supplier):
+            connection.execute(insert(model.__table__).values(id=1, name="Обувь"))
+        connection.execute(insert(Product.__table__), [
+            {"id": i, "article": f"A{i}", "name": f"Товар {i}", "category_id": 1, "manufacturer_id": 1,
+             "supplier_id": 1, "price": 100.0, "unit": "шт.", "stock_quantity": STOCK}
+            for i in (1, 2)
+        ])
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def stock(db, product_id: int = 1) -> int:
+    db.expire_all()
+    return db.scalar(select(Product.stock_quantity).where(Product.id == product_id))
+
+
+def items(product_id: int = 1, quantity: int = 3) -> list:
+    return [OrderItemBase(product_id=product_id, quantity=quantity, price=100.0)]
+
+
+@pytest.fixture
+def order(db) -> Order:
+    return create_order(db, OrderCreate(
+        article="A1, 3", status="новый", pickup_address="Пункт выдачи", order_date=datetime.now(), items=items()
+    ))
+
+
+def test_cancel_returns_reserved_stock(db, order):
+    assert stock(db) == STOCK - 3
+    update_order(db, order.id, OrderUpdate(status="отменен"))
+    assert stock(db) == STOCK
+    update_order(db, order.id, OrderUpdate(status="новый"))
+    assert stock(db) == STOCK - 3
+
+
+def test_completed_to_cancelled_keeps_stock(db, order):
+    update_order(db, order.id, OrderUpdate(status="выполнен"))
+    assert stock(db) == STOCK - 3
+    update_order(db, order.id, OrderUpdate(status="отменен"))
+    assert stock(db) == STOCK - 3
+
+
+def test_completed_items_change_keeps_stock(db, order):
+    update_order(db, order.id, OrderUpdate(status="выполнен"))
+    update_order(db, order.id, OrderUpdate(items=items(product_id=2, quantity=5)))
+    assert (stock(db, 1), stock(db, 2)) == (STOCK - 3, STOCK)
+
+
+def test_completed_then_reopened_and_deleted_keeps_stock(db, order):
+    update_order(db, order.id, OrderUpdate(status="выполнен"))
+    update_order(db, order.id, OrderUpdate(status="новый"))
+    assert delete_order(db, order.id)
+    assert stock(db) == STOCK - 3
+
+
+def test_delete_returns_reserved_stock(db, order):
+    assert delete_order(db, order.id)
+    assert stock(db) == STOCK
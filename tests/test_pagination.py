@@ -0,0 +1,38 @@
+"""
+Курсоры страниц: неверный курсор — ValueError (в роутерах — ответ 400)
+"""
+import base64
+
+import pytest
+
+from app.models import Product
+from app.services.pagination import cursor_value_matches, decode_cursor, encode_cursor
+
+
+def raw_cursor(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor([3, 41])) == [3, 41]
+    assert decode_cursor(encode_cursor(["А-1", 2.5])) == ["А-1", 2.5]
+
+
+@pytest.mark.parametrize("cursor", [
+    "W3t9XQ",  # [{}]
+    raw_cursor("[[1]]"),
+    raw_cursor("[null]"),
+    raw_cursor("[true]"),
+    raw_cursor('{"id": 1}'),
+    "не base64",
+])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_cursor_value_must_match_key_column():
+    assert cursor_value_matches(Product.id, 10)
+    assert not cursor_value_matches(Product.id, "10")
+    assert not cursor_value_matches(Product.stock_quantity, 1.5)
+    assert cursor_value_matches(Product.price, 100)
@@ -0,0 +1,134 @@
+"""
+Проверки работы с PostgreSQL
+
+Выполняются, только если задан TEST_DATABASE_URL, например
+postgresql://postgres@localhost:5432/shoe_store_test. Схема public этой
+базы пересоздаётся — не указывайте рабочую базу.
+"""
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.orm import Session
+
+from app.database import get_database_url, get_engine_options, init_db
+from app.importer import import_products
+from app.models import Category, Manufacturer, Order, Product, Supplier
+from app.schemas import OrderCreate
+from app.services.order_service import allocate_order_codes, build_order_items, create_order
+from app.services.product_service import get_products, get_products_page
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL or not TEST_DATABASE_URL.startswith(("postgresql", "postgres:")),
+    reason="TEST_DATABASE_URL с базой PostgreSQL не задан"
+)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    url = get_database_url(TEST_DATABASE_URL)
+    engine = create_engine(url, **get_engine_options(url))
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP SCHEMA public CASCADE")
+        connection.exec_driver_sql("CREATE SCHEMA public")
+    init_db(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture(scope="module")
+def catalog(engine):
+    """Справочники и два товара: id по артикулу"""
+    with Session(engine) as session:
+        category = Category(name="Мужская обувь")
+        manufacturer = Manufacturer(name="Kari")
+        supplier = Supplier(name="Обувь для вас")
+        session.add_all([category, manufacturer, supplier])
+        session.flush()
+        for article, name, stock in (("PG0001", "Ботинки зимние", 5), ("PG0002", "Кроссовки беговые", 1)):
+            session.add(Product(
+                article=article, name=name, description="Натуральная кожа", price=3000, unit="шт.",
+                stock_quantity=stock, category_id=category.id, manufacturer_id=manufacturer.id,
+                supplier_id=supplier.id
+            ))
+        session.commit()
+        return dict(session.execute(select(Product.article, Product.id)).all())
+
+
+def test_init_db_creates_schema_and_is_repeatable(engine):
+    init_db(engine)
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    assert {"products", "orders", "order_items", "counters", "change_log", "products_fts"} <= tables
+    assert "order_code_seq" in inspector.get_sequence_names()
+    assert "ix_products_fts_document" in {index["name"] for index in inspector.get_indexes("products_fts")}
+
+
+def test_full_text_search(db, catalog):
+    assert [p.article for p in get_products(db, search="ботин", ranked=True)] == ["PG0001"]
+    assert [p.article for p in get_products_page(db, search="кожа кроссовки").items] == ["PG0002"]
+
+    # Индекс обновляется триггерами и при изменении справочника
+    db.execute(text("UPDATE manufacturers SET name = 'Саламандер' WHERE name = 'Kari'"))
+    db.commit()
+    assert {p.article for p in get_products(db, search="саламандер")} == {"PG0001", "PG0002"}
+    db.execute(text("UPDATE manufacturers SET name = 'Kari' WHERE name = 'Саламандер'"))
+    db.commit()
+
+
+def test_allocate_order_codes_uses_sequence(db):
+    before = db.scalar(text("SELECT last_value FROM order_code_seq"))
+    codes = allocate_order_codes(db, 50) + allocate_order_codes(db)
+    db.commit()
+
+    assert len(set(codes)) == 51
+    assert all(code.isdigit() and len(code) == 7 for code in codes)
+    assert db.scalar(text("SELECT last_value FROM order_code_seq")) >= before + 50
+
+
+def test_reserve_stock_shortage_rolls_back_order(db, catalog):
+    def order(lines):
+        return OrderCreate(
+            article=", ".join(f"{article}, {quantity}" for article, quantity in lines),
+            status="новый", pickup_address="Пункт выдачи", order_date=datetime.now(),
+            items=build_order_items(db, lines)
+        )
+
+    orders_before = db.scalar(select(Order.id).order_by(Order.id.desc()).limit(1))
+    with pytest.raises(ValueError, match="PG0002"):
+        create_order(db, order([("PG0001", 2), ("PG0002", 3)]))
+
+    stock = dict(db.execute(select(Product.article, Product.stock_quantity)).all())
+    assert stock["PG0001"] == 5 and stock["PG0002"] == 1
+    assert db.scalar(select(Order.id).order_by(Order.id.desc()).limit(1)) == orders_before
+
+    created = create_order(db, order([("PG0001", 2)]))
+    assert created.stock_reserved
+    assert db.scalar(select(Product.stock_quantity).where(Product.article == "PG0001")) == 3
+
+
+def test_upsert_import(db, tmp_path):
+    header = "article,name,category,manufacturer,supplier,price,unit,stock_quantity,discount_percent,description\n"
+    rows = ["IMP001,Туфли,Женская обувь,Marco Tozzi,Обувь для вас,4000,шт.,2,0,", "IMP002,Сапоги,Женская обувь,Rieker,Обувь для вас,7000,шт.,4,5,"]
+    source = tmp_path / "products.csv"
+    source.write_text(header + "\n".join(rows) + "\n", encoding="utf-8")
+    result = import_products(db, str(source))
+    assert (result.imported, result.updated) == (2, 0)
+
+    rows[0] = rows[0].replace("4000", "4500")
+    source.write_text(header + "\n".join(rows) + "\n", encoding="utf-8")
+    assert import_products(db, str(source)).imported == 0
+    result = import_products(db, str(source), upsert=True)
+    assert (result.imported, result.updated) == (0, 1)
+
+    prices = dict(db.execute(select(Product.article, Product.price).where(Product.article.like("IMP%"))).all())
+    assert prices == {"IMP001": 4500, "IMP002": 7000}
@@ -0,0 +1,51 @@
+"""
+Импорт товаров: строки с повторным артикулом и другими данными не теряются молча
+"""
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401 — таблицы в Base.metadata
+from app.database import Base
+from app.importer import import_products
+from app.models import Product
+
+HEADER = "article,name,category,manufacturer,supplier,price,unit,stock_quantity,discount_percent,description\n"
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def write_source(tmp_path, rows: list[str]) -> str:
+    source = tmp_path / "products.csv"
+    source.write_text(HEADER + "\n".join(rows) + "\n", encoding="utf-8")
+    return str(source)
+
+
+def test_generated_article_collision_is_reported(db, tmp_path):
+    source = write_source(tmp_path, [
+        ",Туфли,Женская обувь,Marco Tozzi,Обувь для вас,4000,шт.,2,0,",
+        ",Туфли,Женская обувь,Marco Tozzi,Обувь для вас,4000,шт.,2,0,",
+        ",Туфли,Женская обувь,Marco Tozzi,Обувь для вас,5200,шт.,1,0,Кожа",
+        ",Сапоги,Женская обувь,Rieker,Обувь для вас,7000,шт.,4,5,",
+    ])
+    result = import_products(db, source, batch_size=2)
+
+    assert (result.total, result.imported, result.conflicts) == (4, 2, 1)
+    assert "другими данными: 1" in result.summary()
+    assert db.scalar(select(Product.price).where(Product.name == "Туфли")) == 4000
+
+
+def test_exact_repeats_are_not_conflicts(db, tmp_path):
+    row = "IMP001,Туфли,Женская обувь,Marco Tozzi,Обувь для вас,4000,шт.,2,0,"
+    result = import_products(db, write_source(tmp_path, [row, row]))
+
+    assert (result.imported, result.conflicts) == (1, 0)
+    assert "другими данными" not in result.summary()
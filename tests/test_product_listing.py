@@ -0,0 +1,105 @@
+"""
+Число SQL-запросов при выводе списка товаров
+
+Категория, производитель и поставщик загружаются в запросе списка
+(build_products_query, eager="joined"), поэтому страница из 1000 товаров
+читается одним запросом, сколько бы товаров на ней ни было.
+"""
+import pytest
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401 — таблицы в Base.metadata
+from app.database import Base
+from app.models import Category, Manufacturer, Product, Supplier
+from app.services.product_service import get_products, get_products_page
+
+PRODUCTS_COUNT = 1000
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for model in (Category, Manufacturer, Supplier):
+            connection.execute(insert(model.__table__), [{"id": i, "name": f"{model.__tablename__} {i}"} for i in range(1, 11)])
+        connection.execute(insert(Product.__table__), [
+            {
+                "article": f"A{i:05d}",
+                "name": f"Ботинки {i}",
+                "category_id": i % 10 + 1,
+                "manufacturer_id": (i // 10) % 10 + 1,
+                "supplier_id": (i // 100) % 10 + 1,
+                "price": 1000 + i,
+                "unit": "шт.",
+                "stock_quantity": i % 37,
+            }
+            for i in range(1, PRODUCTS_COUNT + 1)
+        ])
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def statements(engine):
+    """Список выполненных SQL-запросов"""
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    yield executed
+    event.remove(engine, "before_cursor_execute", count)
+
+
+def second_stock_page(db, limit):
+    first = get_products_page(db, limit=limit, sort_by_stock="asc")
+    return get_products_page(db, cursor=first.next_cursor, limit=limit, sort_by_stock="asc").items
+
+
+LISTINGS = {
+    "plain": lambda db, limit: get_products(db, limit=limit),
+    "search": lambda db, limit: get_products(db, limit=limit, search="ботинки", ranked=True),
+    "stock": lambda db, limit: get_products(db, limit=limit, sort_by_stock="desc"),
+    "supplier": lambda db, limit: get_products(db, limit=limit, supplier_id=3),
+    "keyset": lambda db, limit: get_products_page(db, limit=limit).items,
+    "keyset_search": lambda db, limit: get_products_page(db, limit=limit, search="ботинки").items,
+    "keyset_stock": second_stock_page,
+}
+
+# Запросов на одну выборку (у keyset_stock — две страницы)
+EXPECTED_STATEMENTS = {"keyset_stock": 2}
+
+
+def render(products) -> list:
+    """Поля карточки товара, включая справочники"""
+    return [(p.article, p.category.name, p.manufacturer.name, p.supplier.name) for p in products]
+
+
+@pytest.mark.parametrize("listing", LISTINGS)
+def test_listing_statement_count_is_constant(db, statements, listing):
+    counts = {}
+    for limit in (10, PRODUCTS_COUNT):
+        db.expunge_all()
+        statements.clear()
+        products = LISTINGS[listing](db, limit)
+        render(products)
+        counts[limit] = len(statements)
+        assert products
+
+    assert counts[10] == counts[PRODUCTS_COUNT] == EXPECTED_STATEMENTS.get(listing, 1)
+
+
+def test_full_page_has_all_products(db):
+    products = get_products(db, limit=PRODUCTS_COUNT)
+    assert len(products) == PRODUCTS_COUNT
+    assert len(get_products(db, limit=PRODUCTS_COUNT, search="ботинки")) == PRODUCTS_COUNT